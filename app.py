@@ -1,20 +1,27 @@
 import streamlit as st
 import os
 from dotenv import load_dotenv
-from src.ui_components import setup_page_config, render_sidebar, render_main_content
+
+# Load .env before the src/utils imports: their settings are read from the environment at import time
+load_dotenv()
+
+from src.ui_components import setup_page_config, bind_session_log_context, render_sidebar, render_main_content
 from src.document_processor import extract_text_from_document
 from src.llm_handler import initialize_chat_llm, process_document
 from utils.helpers import validate_api_key
 from utils.logger import setup_logger, log_info, log_error
+from utils.metrics import start_metrics_server
 
 def main():
     # Initialize logging
     setup_logger()
+    bind_session_log_context()
     log_info("Application started")
     
-    # Load environment variables from .env file
-    load_dotenv()
-    log_info("Environment variables loaded from .env file")
+    # Expose Prometheus metrics when a port is configured (started once per process)
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port:
+        start_metrics_server(int(metrics_port))
     
     # Setup page configuration
     setup_page_config()
@@ -26,10 +33,10 @@ def main():
     col1, col2 = st.columns([1, 3])
     
     with col1:
-        uploaded_file, chunk_size, chunk_overlap = render_sidebar()
+        uploaded_files, settings = render_sidebar()
     
     with col2:
-        render_main_content(uploaded_file, chunk_size, chunk_overlap, api_key_valid)
+        render_main_content(uploaded_files, settings, api_key_valid)
 
 if __name__ == "__main__":
     main()
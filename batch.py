@@ -0,0 +1,206 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+# src modules read LLM_BACKEND, model and concurrency settings on import
+load_dotenv()
+
+from src.extractive import compress_text
+from src.sections import filter_sections, iter_filtered_sections, DEFAULT_EXCLUDED_SECTIONS
+from src.document_processor import (ExtractionStream, LocalFile, extract_text_from_document,
+                                    is_supported_file_type)
+from src.job_queue import make_document_cache_key
+from src.llm_handler import (initialize_chat_llm, process_document, process_document_stream, LLM_BACKEND,
+                             CALL_TOKEN_BUDGET)
+from src.rate_limiter import (configure_rate_limiter, DEFAULT_REQUESTS_PER_MINUTE,
+                              DEFAULT_TOKENS_PER_MINUTE, DEFAULT_MAX_CONCURRENCY)
+from src.spool import MappedFile, SPOOL_THRESHOLD_BYTES
+from src.summary_cache import get_cached_summary, store_summary
+from utils.helpers import validate_api_key
+from utils.logger import setup_logger, log_info, log_error, log_context
+from utils.metrics import record_stage, write_metrics_file, METRICS_FILE
+
+
+def find_documents(directory=None, manifest=None):
+    """List supported documents from a directory tree and/or a manifest of paths"""
+    paths = []
+    if directory:
+        for root, _, files in os.walk(directory):
+            paths.extend(os.path.join(root, name) for name in sorted(files) if is_supported_file_type(name))
+    if manifest:
+        with open(manifest, 'r', encoding='utf-8') as f:
+            paths.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return sorted(set(os.path.abspath(path) for path in paths))
+
+
+def load_completed(output_path):
+    """Get paths already summarized successfully in a previous run"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partial line from an interrupted run
+            if record.get('status') == 'ok':
+                completed.add(record['path'])
+    return completed
+
+
+def summarize_file(path, llm, token_budget, chunk_overlap, max_concurrency, compression_ratio=1.0,
+                   excluded_sections=DEFAULT_EXCLUDED_SECTIONS, map_llm=None):
+    """Extract and summarize one document, returning a JSONL record"""
+    start_time = time.time()
+    record = {'path': path, 'status': 'error'}
+    
+    try:
+        with log_context(document=path):
+            with open(path, 'rb') as f:
+                file_hash = hashlib.file_digest(f, 'sha256').hexdigest()
+            cache_key = make_document_cache_key(file_hash, token_budget, chunk_overlap,
+                                                excluded_sections, compression_ratio)
+            summary = get_cached_summary(cache_key)
+            record['cached'] = bool(summary)
+            
+            if not summary:
+                # Large files are parsed through mmap instead of being read into memory
+                if os.path.getsize(path) >= SPOOL_THRESHOLD_BYTES:
+                    document_file = MappedFile(path)
+                else:
+                    document_file = LocalFile.from_path(path)
+                with document_file:
+                    if compression_ratio < 1.0:
+                        summary = _summarize_compressed(document_file, record, llm, token_budget,
+                                                        chunk_overlap, max_concurrency, compression_ratio,
+                                                        excluded_sections, map_llm)
+                    else:
+                        # Chunks are summarized while later pages are still being extracted
+                        stream = ExtractionStream(document_file)
+                        summary = process_document_stream(iter_filtered_sections(stream, excluded_sections),
+                                                          llm, token_budget, chunk_overlap,
+                                                          max_concurrency=max_concurrency, map_llm=map_llm)
+                        record['characters'] = stream.characters
+                if not record.get('characters'):
+                    record['error'] = "Failed to extract text"
+                    return record
+                if not summary:
+                    record['error'] = "Failed to generate summary"
+                    return record
+                store_summary(cache_key, summary)
+            
+            record['status'] = 'ok'
+            record['summary'] = summary
+            return record
+    except Exception as e:
+        log_error(f"Batch processing failed for {path}: {str(e)}", document=path)
+        record['error'] = str(e)
+        return record
+    finally:
+        record['seconds'] = round(time.time() - start_time, 2)
+        record_stage("document", time.time() - start_time, record.get('characters', 0),
+                     len(record.get('summary', "")), error=record['status'] != 'ok')
+
+
+def _summarize_compressed(document_file, record, llm, token_budget, chunk_overlap, max_concurrency,
+                         compression_ratio, excluded_sections, map_llm):
+    """Extract the full text, apply the pre-stages and summarize it"""
+    text = extract_text_from_document(document_file)
+    if not text:
+        return None
+    record['characters'] = len(text)
+    text = compress_text(filter_sections(text, excluded_sections), compression_ratio)
+    return process_document(text, llm, token_budget, chunk_overlap,
+                            max_concurrency=max_concurrency, map_llm=map_llm)
+
+
+def run_batch(paths, output_path, workers, token_budget, chunk_overlap, max_concurrency,
+              compression_ratio=1.0, excluded_sections=DEFAULT_EXCLUDED_SECTIONS):
+    """Summarize documents on a worker pool, appending one JSON record per document"""
+    llm = initialize_chat_llm(stage="reduce")
+    map_llm = initialize_chat_llm(stage="map")
+    if not llm or not map_llm:
+        raise RuntimeError("Failed to initialize ChatGoogleGenerativeAI")
+    
+    stats = {'ok': 0, 'error': 0, 'cached': 0, 'characters': 0}
+    write_lock = threading.Lock()
+    start_time = time.time()
+    
+    with open(output_path, 'a', encoding='utf-8') as output, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as executor:
+        futures = [
+            executor.submit(summarize_file, path, llm, token_budget, chunk_overlap, max_concurrency,
+                            compression_ratio, excluded_sections, map_llm)
+            for path in paths
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            with write_lock:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+            
+            stats[record['status']] += 1
+            stats['cached'] += int(record.get('cached', False))
+            stats['characters'] += record.get('characters', 0)
+            log_info(f"[{done}/{len(paths)}] {record['status']} {record['path']} ({record['seconds']}s)")
+    
+    stats['seconds'] = time.time() - start_time
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a directory or manifest of documents to JSONL")
+    parser.add_argument("directory", nargs="?", help="Directory to scan recursively for documents")
+    parser.add_argument("--manifest", help="File listing one document path per line")
+    parser.add_argument("--output", default="summaries.jsonl", help="JSONL output file (appended to)")
+    parser.add_argument("--workers", type=int, default=4, help="Documents processed in parallel")
+    parser.add_argument("--llm-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="Global cap on in-flight LLM calls across all documents")
+    parser.add_argument("--token-budget", type=int, default=CALL_TOKEN_BUDGET,
+                        help="Estimated input tokens per LLM call")
+    parser.add_argument("--chunk-overlap", type=int, default=500)
+    parser.add_argument("--compression-ratio", type=float, default=1.0,
+                        help="Send only this fraction of each text to the LLM, keeping central sentences")
+    parser.add_argument("--skip-sections", nargs="*", default=list(DEFAULT_EXCLUDED_SECTIONS),
+                        help="Detected sections to leave out (e.g. references appendix); pass none to keep all")
+    parser.add_argument("--no-resume", action="store_true", help="Reprocess documents already in the output")
+    args = parser.parse_args()
+    
+    if not args.directory and not args.manifest:
+        parser.error("provide a directory and/or --manifest")
+    
+    setup_logger()
+    if LLM_BACKEND != "fake" and not validate_api_key():
+        parser.exit(1, "GOOGLE_API_KEY is not set\n")
+    
+    configure_rate_limiter(DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE, args.llm_concurrency)
+    
+    paths = find_documents(args.directory, args.manifest)
+    completed = set() if args.no_resume else load_completed(args.output)
+    pending = [path for path in paths if path not in completed]
+    print(f"Found {len(paths)} documents, {len(paths) - len(pending)} already done, {len(pending)} to process")
+    if not pending:
+        return
+    
+    stats = run_batch(pending, args.output, args.workers, args.token_budget, args.chunk_overlap,
+                      args.llm_concurrency, args.compression_ratio, tuple(args.skip_sections))
+    
+    elapsed = max(stats['seconds'], 1e-9)
+    print(f"Processed {len(pending)} documents in {elapsed:.1f}s: "
+          f"{stats['ok']} ok ({stats['cached']} from cache), {stats['error']} failed")
+    print(f"Throughput: {len(pending) / elapsed * 60:.1f} documents/min, "
+          f"{stats['characters'] / elapsed:,.0f} characters/s")
+    
+    write_metrics_file()
+    print(f"Stage metrics written to {METRICS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Compare chunk_text against LangChain's RecursiveCharacterTextSplitter
+
+"native" is plain splitting (section_aware=False), the like-for-like comparison with
+LangChain; "sections" is the default section-aware chunking, including section detection.
+
+Run from the project root:
+
+    python -m benchmarks.bench_chunker
+"""
+import argparse
+import statistics
+import time
+from functools import partial
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from benchmarks.bench_pipeline import make_synthetic_document
+from src.llm_handler import chunk_text, CHUNK_SEPARATORS
+
+DOCUMENT_SIZES = {"100k": 100_000, "1M": 1_000_000, "5M": 5_000_000}
+
+
+def langchain_chunk_text(text, chunk_size, overlap):
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=overlap,
+        separators=CHUNK_SEPARATORS + [""]
+    )
+    return splitter.split_text(text)
+
+
+def measure(func, text, chunk_size, overlap, repeats):
+    """Return the chunks and best CPU time over several runs"""
+    best = None
+    for _ in range(repeats):
+        start_time = time.process_time()
+        chunks = func(text, chunk_size, overlap)
+        elapsed = time.process_time() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return chunks, best
+
+
+def describe(chunks, chunk_size):
+    sizes = [len(chunk) for chunk in chunks]
+    return {
+        "chunks": len(chunks),
+        "mean": round(statistics.mean(sizes)),
+        "max": max(sizes),
+        "oversized": sum(size > chunk_size for size in sizes),
+        "mid_sentence_ends": sum(not chunk.rstrip().endswith((".", "\n")) for chunk in chunks[:-1])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunk_text against the LangChain splitter")
+    parser.add_argument("--sizes", nargs="+", choices=list(DOCUMENT_SIZES), default=list(DOCUMENT_SIZES))
+    parser.add_argument("--chunk-size", type=int, default=4000)
+    parser.add_argument("--chunk-overlap", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    
+    print(f"{'document':<10}{'splitter':<12}{'cpu s':>9}{'chunks':>8}{'mean':>7}{'max':>7}"
+          f"{'oversized':>11}{'mid-sentence':>14}")
+    for label in args.sizes:
+        text = make_synthetic_document(DOCUMENT_SIZES[label])
+        splitters = (("native", partial(chunk_text, section_aware=False)),
+                     ("sections", chunk_text),
+                     ("langchain", langchain_chunk_text))
+        for name, func in splitters:
+            chunks, cpu = measure(func, text, args.chunk_size, args.chunk_overlap, args.repeats)
+            stats = describe(chunks, args.chunk_size)
+            print(f"{label:<10}{name:<12}{cpu:>9.4f}{stats['chunks']:>8}{stats['mean']:>7}{stats['max']:>7}"
+                  f"{stats['oversized']:>11}{stats['mid_sentence_ends']:>14}")
+
+
+if __name__ == "__main__":
+    main()
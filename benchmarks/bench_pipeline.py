@@ -0,0 +1,165 @@
+"""End-to-end pipeline benchmark against the offline FakeChatLLM backend
+
+Run from the project root:
+
+    python -m benchmarks.bench_pipeline                  # compare against the saved baseline
+    python -m benchmarks.bench_pipeline --save-baseline  # record a new baseline
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from src.document_processor import LocalFile, extract_text_from_document
+from src.fake_llm import FakeChatLLM
+from src.llm_handler import (chunk_text, summarize_chunks, reduce_summaries, max_chunk_chars,
+                             plan_chunk_size, CALL_TOKEN_BUDGET, MAX_CONCURRENT_CHUNKS)
+from src.rate_limiter import configure_rate_limiter
+
+DOCUMENT_SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Relative slowdown (or memory growth) tolerated before a stage is flagged as a regression
+DEFAULT_TOLERANCE = 0.25
+
+VOCABULARY = ("model data results method analysis learning network training performance "
+              "experiment baseline accuracy dataset evaluation approach proposed significant "
+              "parameters distribution sample error layer feature algorithm").split()
+
+
+def make_synthetic_document(size, seed=0):
+    """Build a deterministic paper-like text of roughly `size` characters"""
+    rng = random.Random(seed)
+    paragraphs = []
+    length = 0
+    while length < size:
+        sentences = []
+        for _ in range(rng.randint(3, 8)):
+            words = rng.choices(VOCABULARY, k=rng.randint(8, 25))
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:size]
+
+
+def run_stage(results, name, llm, func, *args, **kwargs):
+    """Run one pipeline stage, recording wall time, LLM calls and peak traced memory"""
+    calls_before = llm.calls
+    tracemalloc.reset_peak()
+    start_time = time.perf_counter()
+    value = func(*args, **kwargs)
+    results[name] = {
+        "seconds": round(time.perf_counter() - start_time, 4),
+        "calls": llm.calls - calls_before,
+        "peak_mb": round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+    }
+    return value
+
+
+def benchmark_document(label, size, llm, token_budget, chunk_overlap, max_concurrency):
+    """Run extraction, chunking, map and reduce for one synthetic document"""
+    document = make_synthetic_document(size)
+    upload = LocalFile(document.encode("utf-8"), f"synthetic_{label}.txt")
+    results = {}
+    
+    text = run_stage(results, "extraction", llm, extract_text_from_document, upload)
+    if len(text) <= max_chunk_chars(token_budget):
+        chunks = run_stage(results, "chunking", llm, lambda: [text])
+    else:
+        chunk_size = plan_chunk_size(len(text), token_budget, chunk_overlap)
+        chunks = run_stage(results, "chunking", llm, chunk_text, text, chunk_size, chunk_overlap)
+    
+    summaries = run_stage(results, "map", llm, summarize_chunks, llm, chunks,
+                          max_concurrency, use_cache=False)
+    summaries = [summary for summary in summaries if summary]
+    if len(chunks) > 1:
+        run_stage(results, "reduce", llm, reduce_summaries, llm, summaries,
+                  max_concurrency=max_concurrency)
+    
+    results["total"] = {
+        "seconds": round(sum(stage["seconds"] for stage in results.values()), 4),
+        "calls": sum(stage["calls"] for stage in results.values()),
+        "peak_mb": max(stage["peak_mb"] for stage in results.values()),
+        "chunks": len(chunks)
+    }
+    return results
+
+
+def find_regressions(current, baseline, tolerance):
+    """List stages that got slower, made more calls or used more memory than the baseline"""
+    regressions = []
+    for label, stages in current.items():
+        for stage, metrics in stages.items():
+            previous = baseline.get(label, {}).get(stage)
+            if not previous:
+                continue
+            if metrics["seconds"] > previous["seconds"] * (1 + tolerance) + 0.01:
+                regressions.append(f"{label}/{stage}: {previous['seconds']}s -> {metrics['seconds']}s")
+            if metrics["calls"] > previous["calls"]:
+                regressions.append(f"{label}/{stage}: {previous['calls']} -> {metrics['calls']} calls")
+            if metrics["peak_mb"] > previous["peak_mb"] * (1 + tolerance) + 1:
+                regressions.append(f"{label}/{stage}: {previous['peak_mb']} -> {metrics['peak_mb']} MB peak")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'document':<10}{'stage':<12}{'seconds':>10}{'calls':>8}{'peak MB':>10}")
+    for label, stages in results.items():
+        for stage, metrics in stages.items():
+            print(f"{label:<10}{stage:<12}{metrics['seconds']:>10.3f}{metrics['calls']:>8}{metrics['peak_mb']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the summarization pipeline offline")
+    parser.add_argument("--sizes", nargs="+", choices=list(DOCUMENT_SIZES), default=list(DOCUMENT_SIZES))
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake LLM latency per call (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output-chars", type=int, default=1500)
+    parser.add_argument("--token-budget", type=int, default=CALL_TOKEN_BUDGET,
+                        help="Estimated input tokens per map call")
+    parser.add_argument("--chunk-overlap", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_CHUNKS)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write results to {BASELINE_PATH}")
+    args = parser.parse_args()
+    
+    # Quotas are irrelevant offline; only the concurrency cap should shape the run
+    configure_rate_limiter(10 ** 9, 10 ** 12, args.concurrency)
+    llm = FakeChatLLM(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      output_chars=args.output_chars)
+    
+    tracemalloc.start()
+    results = {}
+    for label in args.sizes:
+        results[label] = benchmark_document(label, DOCUMENT_SIZES[label], llm, args.token_budget,
+                                            args.chunk_overlap, args.concurrency)
+    tracemalloc.stop()
+    print_results(results)
+    
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {BASELINE_PATH}")
+        return
+    
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline found; run with --save-baseline to create one")
+        return
+    with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    
+    regressions = find_regressions(results, baseline, args.tolerance)
+    if regressions:
+        print("Regressions against baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+from dotenv import load_dotenv
+
+# This page can be the first script a session runs, so load .env before src is imported
+load_dotenv()
+
+from src.ui_components import setup_page_config, bind_session_log_context
+from src.diagnostics import render_diagnostics
+from utils.logger import setup_logger
+
+def main():
+    setup_logger()
+    setup_page_config()
+    render_diagnostics(bind_session_log_context())
+
+main()
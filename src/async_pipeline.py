@@ -0,0 +1,172 @@
+import asyncio
+import time
+from src.llm_handler import (build_chunk_messages, build_final_messages, batch_summaries,
+                             chunk_text, plan_chunk_size, max_chunk_chars,
+                             CALL_TOKEN_BUDGET, REDUCE_TOKEN_BUDGET, MAX_CONCURRENT_CHUNKS,
+                             RATE_LIMIT_RETRIES, RATE_LIMIT_BACKOFF_SECONDS,
+                             MAP_MODEL_ID, MAP_PROFILE, MAP_PROMPT_VERSION, MODEL_TEMPERATURE)
+from src.rate_limiter import get_rate_limiter, is_rate_limit_error
+from src.summary_cache import make_chunk_cache_key, get_cached_summary, store_summary
+from utils.helpers import estimate_tokens
+from utils.logger import log_info, log_error, log_warning
+from utils.metrics import record_stage, record_retry
+
+
+async def ainvoke_with_rate_limit(llm, messages):
+    """Invoke the LLM asynchronously through the shared rate limiter, backing off on quota errors"""
+    limiter = get_rate_limiter()
+    tokens = sum(estimate_tokens(message.content) for message in messages)
+    
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        # Poll the limiter instead of blocking the event loop on its lock
+        while True:
+            wait = limiter.try_acquire(tokens)
+            if wait == 0:
+                break
+            await asyncio.sleep(wait)
+        
+        throttled = False
+        try:
+            response = await llm.ainvoke(messages)
+        except Exception as e:
+            throttled = is_rate_limit_error(e)
+            if not throttled or attempt == RATE_LIMIT_RETRIES:
+                raise
+        finally:
+            # Also runs on cancellation, which is not an Exception
+            limiter.release(throttled=throttled)
+        
+        if not throttled:
+            return response
+        record_retry()
+        backoff = RATE_LIMIT_BACKOFF_SECONDS * (2 ** attempt)
+        log_warning(f"Rate limited, retrying in {backoff} seconds (attempt {attempt + 1}/{RATE_LIMIT_RETRIES})")
+        await asyncio.sleep(backoff)
+
+
+async def asummarize_text_chunk(llm, text, chunk_num=None, profile="full"):
+    """Summarize a single text chunk asynchronously"""
+    chunk_info = f" (chunk {chunk_num})" if chunk_num else ""
+    log_info(f"Starting async summarization{chunk_info} - {len(text)} characters")
+    
+    stage = "map" if chunk_num else "single_pass"
+    start_time = time.time()
+    try:
+        response = await ainvoke_with_rate_limit(llm, build_chunk_messages(text, profile))
+        log_info(f"Async summarization completed{chunk_info} in {time.time() - start_time:.2f} seconds")
+        record_stage(stage, time.time() - start_time, len(text), len(response.content))
+        return response.content
+    except Exception as e:
+        log_error(f"Error generating summary{chunk_info}: {str(e)}")
+        record_stage(stage, time.time() - start_time, len(text), error=True)
+        return None
+
+
+async def acreate_final_summary(llm, chunk_summaries):
+    """Combine chunk summaries into a final summary asynchronously"""
+    log_info(f"Creating async final summary from {len(chunk_summaries)} chunk summaries")
+    
+    input_chars = sum(len(summary) for summary in chunk_summaries)
+    start_time = time.time()
+    try:
+        response = await ainvoke_with_rate_limit(llm, build_final_messages(chunk_summaries))
+        log_info(f"Async final summary completed in {time.time() - start_time:.2f} seconds")
+        record_stage("reduce", time.time() - start_time, input_chars, len(response.content))
+        return response.content
+    except Exception as e:
+        log_error(f"Error creating final summary: {str(e)}")
+        record_stage("reduce", time.time() - start_time, input_chars, error=True)
+        return None
+
+
+async def asummarize_chunks(llm, chunks, max_concurrency=MAX_CONCURRENT_CHUNKS,
+                            on_chunk_done=None, use_cache=True):
+    """Summarize chunks concurrently on the event loop, returning summaries in chunk order"""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    summaries = [None] * len(chunks)
+    
+    async def summarize(i, chunk):
+        cache_key = None
+        if use_cache:
+            cache_key = make_chunk_cache_key(chunk, MAP_MODEL_ID, MODEL_TEMPERATURE, MAP_PROMPT_VERSION)
+            cached = await asyncio.to_thread(get_cached_summary, cache_key)
+            if cached:
+                return i, cached
+        async with semaphore:
+            summary = await asummarize_text_chunk(llm, chunk, i + 1, MAP_PROFILE)
+        if summary and cache_key:
+            await asyncio.to_thread(store_summary, cache_key, summary)
+        return i, summary
+    
+    completed = 0
+    for task in asyncio.as_completed([summarize(i, chunk) for i, chunk in enumerate(chunks)]):
+        i, summaries[i] = await task
+        if not summaries[i]:
+            log_warning(f"Failed to process chunk {i+1}")
+        completed += 1
+        if on_chunk_done:
+            await on_chunk_done(completed, len(chunks))
+    
+    return summaries
+
+
+async def areduce_summaries(llm, summaries, token_budget=REDUCE_TOKEN_BUDGET,
+                            max_concurrency=MAX_CONCURRENT_CHUNKS):
+    """Tree-reduce summaries asynchronously until one final summary remains"""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    level = 0
+    
+    async def reduce_batch(batch):
+        async with semaphore:
+            return await acreate_final_summary(llm, batch)
+    
+    while len(summaries) > 1 and sum(estimate_tokens(summary) for summary in summaries) > token_budget:
+        level += 1
+        batches = batch_summaries(summaries, token_budget)
+        log_info(f"Async reduce level {level}: {len(summaries)} summaries -> {len(batches)} batches")
+        
+        results = await asyncio.gather(*(reduce_batch(batch) for batch in batches))
+        summaries = [result for result in results if result]
+        if not summaries:
+            log_error(f"Async reduce level {level} produced no summaries")
+            return None
+    
+    return await acreate_final_summary(llm, summaries)
+
+
+async def aprocess_document(text, llm, token_budget=CALL_TOKEN_BUDGET, chunk_overlap=500,
+                            max_concurrency=MAX_CONCURRENT_CHUNKS, on_progress=None, map_llm=None):
+    """Summarize a document on the event loop
+    
+    on_progress, if given, is awaited as on_progress(percent, message). Chunk summaries use
+    map_llm when given; the final summary always uses llm.
+    """
+    async def report(percent, message):
+        if on_progress:
+            await on_progress(percent, message)
+    
+    log_info(f"Starting async document processing: ~{estimate_tokens(text)} tokens")
+    
+    if len(text) <= max_chunk_chars(token_budget):
+        await report(50, "Generating summary...")
+        summary = await asummarize_text_chunk(llm, text)
+        await report(100, "Summary complete")
+        return summary
+    
+    chunk_size = plan_chunk_size(len(text), token_budget, chunk_overlap)
+    chunks = chunk_text(text, chunk_size, chunk_overlap)
+    await report(25, f"Processing {len(chunks)} sections...")
+    
+    async def on_chunk_done(completed, total):
+        await report(25 + completed * 50 // total, f"Processed {completed} of {total} sections...")
+    
+    results = await asummarize_chunks(map_llm or llm, chunks, max_concurrency, on_chunk_done)
+    chunk_summaries = [summary for summary in results if summary]
+    if not chunk_summaries:
+        log_error("No chunk summaries generated")
+        return None
+    
+    await report(90, "Creating final comprehensive summary...")
+    final_summary = await areduce_summaries(llm, chunk_summaries, max_concurrency=max_concurrency)
+    await report(100, "Summary complete")
+    return final_summary
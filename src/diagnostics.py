@@ -0,0 +1,117 @@
+from datetime import datetime
+import numpy as np
+import streamlit as st
+from utils.logger import query_logs, get_log_stats
+from utils.metrics import METRICS_FILE
+
+# Most recent stage events aggregated on the diagnostics page
+DEFAULT_EVENT_LIMIT = 2000
+
+LOG_LEVELS = ["ERROR", "WARNING", "INFO", "DEBUG"]
+
+
+def load_stage_events(limit=DEFAULT_EVENT_LIMIT, session=None, document=None):
+    """Get recent stage timing records from the log, oldest first"""
+    events = query_logs(limit=limit, session=session, document=document,
+                        match=lambda entry: "stage" in entry and "seconds" in entry)
+    events.reverse()
+    return events
+
+
+def stage_statistics(events):
+    """Aggregate stage events into count, error rate, latency percentiles and throughput per stage"""
+    by_stage = {}
+    for event in events:
+        by_stage.setdefault(event["stage"], []).append(event)
+
+    rows = []
+    for stage, stage_events in by_stage.items():
+        seconds = np.array([event["seconds"] for event in stage_events], dtype=float)
+        errors = sum(1 for event in stage_events if event.get("error"))
+        input_chars = sum(event.get("input_chars", 0) for event in stage_events)
+        busy_seconds = seconds.sum()
+        rows.append({
+            "Stage": stage,
+            "Calls": len(stage_events),
+            "Error rate": f"{errors / len(stage_events):.1%}",
+            "p50 (s)": round(float(np.percentile(seconds, 50)), 3),
+            "p99 (s)": round(float(np.percentile(seconds, 99)), 3),
+            "Chars/s": round(input_chars / busy_seconds) if busy_seconds > 0 else None,
+        })
+    return rows
+
+
+def document_throughput(events):
+    """Documents per minute and characters per second over the span of the document events"""
+    documents = [event for event in events if event["stage"] == "document"]
+    if len(documents) < 2:
+        return None
+
+    first = datetime.fromisoformat(documents[0]["time"])
+    last = datetime.fromisoformat(documents[-1]["time"])
+    # Count the first document's own duration so a short burst is not divided by ~0
+    span = (last - first).total_seconds() + documents[0]["seconds"]
+    if span <= 0:
+        return None
+    return {
+        "documents_per_minute": len(documents) / span * 60,
+        "chars_per_second": sum(event.get("input_chars", 0) for event in documents) / span,
+    }
+
+
+def render_diagnostics(session_id=None):
+    """Render the performance dashboard and log browser"""
+    st.markdown('<div class="main-header"><h1>🩺 Diagnostics</h1></div>', unsafe_allow_html=True)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        only_mine = st.checkbox("This session only", value=False, disabled=not session_id)
+    with col2:
+        document = st.text_input("Document name contains", "")
+    with col3:
+        limit = st.number_input("Events to scan", min_value=100, max_value=50000,
+                                value=DEFAULT_EVENT_LIMIT, step=500)
+    session = session_id if only_mine else None
+
+    events = load_stage_events(int(limit), session, document or None)
+
+    st.subheader("⏱️ Stage Timings")
+    if not events:
+        st.info("No summarization timings logged yet.")
+    else:
+        rows = stage_statistics(events)
+        st.dataframe(rows, hide_index=True, width="stretch")
+
+        throughput = document_throughput(events)
+        if throughput:
+            metric1, metric2 = st.columns(2)
+            metric1.metric("Documents / min", f"{throughput['documents_per_minute']:.1f}")
+            metric2.metric("Characters / s", f"{throughput['chars_per_second']:,.0f}")
+
+        documents = [event for event in events if event["stage"] == "document"]
+        if documents:
+            st.caption("Recent end-to-end document times (seconds)")
+            st.line_chart([event["seconds"] for event in documents])
+
+    st.subheader("🚨 Recent Errors")
+    errors = query_logs(limit=20, level=("ERROR", "WARNING"), session=session, document=document or None)
+    if errors:
+        st.dataframe([
+            {key: entry.get(key) for key in ("time", "level", "document", "message")}
+            for entry in errors
+        ], hide_index=True, width="stretch")
+    else:
+        st.success("No errors or warnings in the recent log.")
+
+    st.subheader("📜 Log Browser")
+    levels = st.multiselect("Levels", LOG_LEVELS, default=["ERROR", "WARNING", "INFO"])
+    entries = query_logs(limit=200, level=levels, session=session, document=document or None)
+    st.dataframe([
+        {key: entry.get(key) for key in ("time", "level", "thread", "session", "document", "message")}
+        for entry in entries
+    ], hide_index=True, width="stretch")
+
+    stats = get_log_stats()
+    if stats["total_logs"]:
+        st.caption(f"{stats['total_logs']} log files, {stats['total_bytes'] / 1e6:.1f} MB in "
+                   f"`{stats['logs_directory']}`. Prometheus metrics: `{METRICS_FILE}`")
@@ -1,8 +1,48 @@
+import codecs
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
 import PyPDF2
 import docx
 import markdown
 import streamlit as st
-from utils.logger import log_info, log_error, log_warning
+from utils.logger import log_info, log_error, log_warning, log_progress
+from utils.metrics import record_stage, stage_timer
+from src.spool import (MappedFile, MemoryBudget, spool_temp_copy, spool_text, text_memory_bytes,
+                       SPOOL_THRESHOLD_BYTES, SPOOL_BLOCK_BYTES, SESSION_MEMORY_BUDGET_BYTES, MB)
+
+# Worker processes for PDF extraction, and the page count below which it stays single-process
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_PDF_MIN_PAGES = int(os.getenv("PARALLEL_PDF_MIN_PAGES", "40"))
+
+# Start method for extraction workers; fork is unsafe from the multithreaded Streamlit server
+PDF_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Parsed uploads kept per session (metadata and extracted text)
+PARSED_DOCUMENT_CACHE_SIZE = 3
+
+# One extraction pool for the whole process, so concurrent documents share its workers
+_extraction_pool = None
+_extraction_pool_lock = threading.Lock()
+
+class LocalFile(BytesIO):
+    """In-memory file with the name/size attributes the extractors expect from uploads"""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+    @classmethod
+    def from_path(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read(), os.path.basename(path))
 
 def extract_text_from_document(uploaded_file):
     """Extract text from various document formats"""
@@ -10,6 +50,15 @@ def extract_text_from_document(uploaded_file):
     
     log_info(f"Processing {file_type.upper()} file: {uploaded_file.name}")
     
+    # Input size for extraction is the file size in bytes
+    with stage_timer("extraction", input_chars=uploaded_file.size) as span:
+        text = _extract_text_by_type(uploaded_file, file_type)
+        span.output_chars = len(text) if text else 0
+        span.error = not text
+    return text
+
+def _extract_text_by_type(uploaded_file, file_type):
+    """Dispatch extraction to the extractor for file_type"""
     try:
         if file_type == 'pdf':
             return extract_text_from_pdf(uploaded_file)
@@ -26,17 +75,196 @@ def extract_text_from_document(uploaded_file):
         log_error(f"Failed to extract text from {uploaded_file.name}: {str(e)}")
         return None
 
-def extract_text_from_pdf(pdf_file):
+def iter_document_text(uploaded_file):
+    """Yield text blocks from a document as they are extracted (pages, paragraphs or whole text)"""
+    file_type = uploaded_file.name.lower().split('.')[-1]
+    
+    log_info(f"Streaming {file_type.upper()} file: {uploaded_file.name}")
+    
+    if file_type == 'pdf':
+        return iter_pdf_text(uploaded_file)
+    elif file_type in ['doc', 'docx']:
+        return iter_docx_blocks(uploaded_file)
+    elif file_type == 'txt':
+        if isinstance(uploaded_file, MappedFile):
+            return iter_txt_blocks(uploaded_file)
+        return _iter_whole_text(extract_text_from_txt(uploaded_file))
+    elif file_type in ['md', 'markdown']:
+        return _iter_whole_text(extract_text_from_markdown(uploaded_file))
+    else:
+        log_error(f"Unsupported file type: {file_type}")
+        return iter(())
+
+class ExtractionStream:
+    """A document's text blocks as they are extracted, for summarizing while extraction continues
+    
+    Records the extraction stage from the time spent extracting only, counts the
+    characters produced in `characters` and sets `finished` once extraction ends.
+    """
+
+    def __init__(self, document_file):
+        self.document_file = document_file
+        self.characters = 0
+        self.finished = False
+
+    def __iter__(self):
+        blocks = iter_document_text(self.document_file)
+        busy_seconds = 0.0
+        failed = False
+        try:
+            while True:
+                start_time = time.perf_counter()
+                try:
+                    block = next(blocks)
+                except StopIteration:
+                    break
+                finally:
+                    busy_seconds += time.perf_counter() - start_time
+                self.characters += len(block)
+                yield block
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.finished = True
+            record_stage("extraction", busy_seconds, self.document_file.size, self.characters,
+                         error=failed or not self.characters)
+
+def _iter_whole_text(text):
+    """Yield already-decoded text as a single block"""
+    if text:
+        yield text
+
+def _iter_reader_pages(pdf_reader, start=0):
+    """Yield the text of each page of an open PDF from `start` on"""
+    page_count = len(pdf_reader.pages)
+    
+    progress_key = f"pdf:{id(pdf_reader)}"
+    for i in range(start, page_count):
+        yield pdf_reader.pages[i].extract_text() or ""
+        log_progress(progress_key, f"Processed PDF page {i+1}/{page_count}", i + 1, page_count)
+
+def iter_txt_blocks(txt_file, block_bytes=SPOOL_BLOCK_BYTES):
+    """Yield UTF-8 text blocks from a file without decoding it in one piece"""
+    log_info("Streaming text from TXT")
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    txt_file.seek(0)
+    while block := txt_file.read(block_bytes):
+        yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+def iter_docx_blocks(docx_file):
+    """Yield DOCX paragraphs followed by table rows as text blocks"""
+    log_info("Extracting text from DOCX")
+    doc = docx.Document(docx_file)
+    
+    # Extract text from paragraphs
+    paragraphs = doc.paragraphs
+    progress_key = f"docx:{id(doc)}"
+    for i, paragraph in enumerate(paragraphs):
+        yield paragraph.text + "\n"
+        log_progress(progress_key, f"Processed {i+1}/{len(paragraphs)} paragraphs", i + 1, len(paragraphs))
+    
+    # Extract text from tables
+    table_count = 0
+    for table in doc.tables:
+        table_count += 1
+        for row in table.rows:
+            yield "".join(cell.text + " " for cell in row.cells) + "\n"
+    
+    if table_count > 0:
+        log_info(f"Extracted text from {table_count} tables")
+
+def _read_file_bytes(file):
+    """Read the full contents of an uploaded file, leaving it rewound"""
+    if hasattr(file, 'getvalue'):
+        return file.getvalue()
+    file.seek(0)
+    data = file.read()
+    file.seek(0)
+    return data
+
+def _extract_pdf_page_range(path, start, end):
+    """Extract text from pages [start, end) of a PDF on disk in a worker process"""
+    with MappedFile(path) as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        return "".join(pdf_reader.pages[i].extract_text() or "" for i in range(start, end))
+
+def get_extraction_pool():
+    """Get the process pool shared by all PDF extractions, creating it on first use"""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            _extraction_pool = ProcessPoolExecutor(max_workers=PDF_EXTRACTION_WORKERS,
+                                                   mp_context=multiprocessing.get_context(PDF_START_METHOD))
+        return _extraction_pool
+
+def _discard_extraction_pool(pool):
+    """Drop a broken pool so the next extraction starts a fresh one"""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is pool:
+            _extraction_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def iter_pdf_ranges_parallel(path, page_count, workers=PDF_EXTRACTION_WORKERS):
+    """Yield (end_page, text) for consecutive page ranges extracted on the shared process pool
+    
+    Workers map the file at `path` themselves, so no PDF bytes cross process boundaries.
+    """
+    # A few ranges per worker evens out pages that are much slower than others
+    range_count = min(page_count, workers * 4)
+    bounds = [page_count * i // range_count for i in range(range_count + 1)]
+    ranges = list(zip(bounds[:-1], bounds[1:]))
+    
+    log_info(f"Extracting {page_count} PDF pages in {len(ranges)} ranges on the shared extraction pool")
+    pool = get_extraction_pool()
+    try:
+        parts = pool.map(_extract_pdf_page_range,
+                         [path] * len(ranges),
+                         [start for start, _ in ranges],
+                         [end for _, end in ranges])
+        # map() yields results in submission order, so pages stay in sequence
+        for (_, end), text in zip(ranges, parts):
+            yield end, text
+    except BrokenProcessPool:
+        _discard_extraction_pool(pool)
+        raise
+
+def iter_pdf_text(pdf_file, workers=PDF_EXTRACTION_WORKERS):
+    """Yield PDF text in page order, fanning long documents out to worker processes
+    
+    Memory-mapped spooled files are handed to workers by path; other files are copied
+    to a temporary spool file once rather than sent to every worker.
+    """
+    log_info("Extracting text from PDF")
+    pdf_reader = PyPDF2.PdfReader(pdf_file)
+    page_count = len(pdf_reader.pages)
+    
+    next_page = 0
+    if workers > 1 and page_count >= PARALLEL_PDF_MIN_PAGES:
+        temp_path = None
+        try:
+            if isinstance(pdf_file, MappedFile):
+                path = pdf_file.path
+            else:
+                path = temp_path = spool_temp_copy(pdf_file)
+            for end, text in iter_pdf_ranges_parallel(path, page_count, workers):
+                yield text
+                next_page = end
+            return
+        except Exception as e:
+            log_warning(f"Parallel PDF extraction failed at page {next_page + 1}, "
+                        f"continuing in a single process: {str(e)}")
+        finally:
+            if temp_path:
+                os.remove(temp_path)
+    yield from _iter_reader_pages(pdf_reader, next_page)
+
+def extract_text_from_pdf(pdf_file, workers=PDF_EXTRACTION_WORKERS):
     """Extract text from PDF file"""
     try:
-        log_info("Extracting text from PDF")
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        
-        for i, page in enumerate(pdf_reader.pages):
-            page_text = page.extract_text()
-            text += page_text
-            log_info(f"Processed PDF page {i+1}/{len(pdf_reader.pages)}")
+        text = "".join(iter_pdf_text(pdf_file, workers))
         
         log_info(f"Successfully extracted {len(text)} characters from PDF")
         return text
@@ -47,27 +275,7 @@ def extract_text_from_pdf(pdf_file):
 def extract_text_from_docx(docx_file):
     """Extract text from DOCX file"""
     try:
-        log_info("Extracting text from DOCX")
-        doc = docx.Document(docx_file)
-        text = ""
-        
-        # Extract text from paragraphs
-        for i, paragraph in enumerate(doc.paragraphs):
-            text += paragraph.text + "\n"
-            if i % 50 == 0:  # Log progress every 50 paragraphs
-                log_info(f"Processed {i+1}/{len(doc.paragraphs)} paragraphs")
-        
-        # Extract text from tables
-        table_count = 0
-        for table in doc.tables:
-            table_count += 1
-            for row in table.rows:
-                for cell in row.cells:
-                    text += cell.text + " "
-                text += "\n"
-        
-        if table_count > 0:
-            log_info(f"Extracted text from {table_count} tables")
+        text = "".join(iter_docx_blocks(docx_file))
         
         log_info(f"Successfully extracted {len(text)} characters from DOCX")
         return text
@@ -159,6 +367,139 @@ def get_document_info(uploaded_file):
         log_warning(f"Could not extract document info: {str(e)}")
         return info
 
+def get_file_hash(uploaded_file):
+    """Get the SHA-256 of an upload's contents, hashing each upload only once per session"""
+    file_hashes = st.session_state.setdefault('file_hashes', {})
+    file_id = getattr(uploaded_file, 'file_id', None) or f"{uploaded_file.name}:{uploaded_file.size}"
+    
+    if file_id not in file_hashes:
+        if hasattr(uploaded_file, 'getbuffer'):
+            # Hash the upload buffer in place rather than copying it
+            with uploaded_file.getbuffer() as view:
+                file_hashes[file_id] = hashlib.sha256(view).hexdigest()
+        else:
+            file_hashes[file_id] = hashlib.sha256(_read_file_bytes(uploaded_file)).hexdigest()
+    return file_hashes[file_id]
+
+def _get_parsed_document(uploaded_file):
+    """Get this session's parsed-document entry for an upload, keyed by content hash"""
+    parsed_documents = st.session_state.setdefault('parsed_documents', {})
+    file_hash = get_file_hash(uploaded_file)
+    
+    # Re-insert so the dict stays ordered from least to most recently used
+    entry = parsed_documents.pop(file_hash, {})
+    parsed_documents[file_hash] = entry
+    while len(parsed_documents) > PARSED_DOCUMENT_CACHE_SIZE:
+        parsed_documents.pop(next(iter(parsed_documents)))
+    return entry
+
+def get_cached_document_info(uploaded_file):
+    """Get document info, parsing each upload at most once per session"""
+    entry = _get_parsed_document(uploaded_file)
+    if 'info' not in entry:
+        entry['info'] = get_document_info(uploaded_file)
+    return dict(entry['info'], name=uploaded_file.name)
+
+def get_cached_document_text(uploaded_file):
+    """Get extracted document text, extracting each upload at most once per session
+    
+    Returns a str, or a SpooledText on disk when the text does not fit the session memory budget.
+    """
+    entry = _get_parsed_document(uploaded_file)
+    text = entry.get('text')
+    if text and not isinstance(text, str) and not os.path.exists(text.path):
+        log_warning(f"Spooled text for {uploaded_file.name} was removed; extracting again")
+        entry.pop('text')
+    if entry.get('text'):
+        log_info(f"Reusing extracted text for {uploaded_file.name}")
+        return entry['text']
+    
+    # Spool files are named per call, so sessions working on the same document never share them
+    text_key = f"{get_file_hash(uploaded_file)}-{uuid.uuid4().hex}"
+    if uploaded_file.size >= SPOOL_THRESHOLD_BYTES:
+        text = extract_document_to_disk(uploaded_file, text_key)
+        if text and _reserve_session_memory(entry, os.path.getsize(text.path)):
+            spooled = text
+            text = spooled.read()
+            # The session now holds the text, so the spooled copy is no longer needed
+            os.remove(spooled.path)
+    else:
+        text = extract_text_from_document(uploaded_file)
+        if text and not _reserve_session_memory(entry, text_memory_bytes(text)):
+            text = spool_text([text], text_key)
+    
+    entry['text'] = text
+    return text
+
+def extract_document_to_disk(uploaded_file, text_key):
+    """Extract a large upload from a memory-mapped spooled copy, streaming the text to disk"""
+    log_info(f"Extracting {uploaded_file.name} through a spooled copy")
+    path = None
+    try:
+        path = spool_temp_copy(uploaded_file)
+        with MappedFile(path, uploaded_file.name) as mapped_file:
+            return extract_mapped_file_to_disk(mapped_file, text_key)
+    except Exception as e:
+        log_error(f"Failed to extract {uploaded_file.name} to disk: {str(e)}")
+        return None
+    finally:
+        # Only the extracted text is needed from here on
+        if path:
+            os.remove(path)
+
+def extract_mapped_file_to_disk(mapped_file, text_key):
+    """Extract a memory-mapped document, streaming its text to a spool file named by text_key"""
+    with stage_timer("extraction", input_chars=mapped_file.size) as span:
+        text = spool_text(iter_document_text(mapped_file), text_key)
+        span.output_chars = len(text)
+        span.error = not len(text)
+    log_info(f"Extracted {len(text)} characters to disk ({text.disk_bytes / MB:.1f} MB)")
+    if not len(text):
+        os.remove(text.path)
+        return None
+    return text
+
+def _reserve_session_memory(entry, size):
+    """Make room for `size` bytes of text in the session budget, dropping older texts if needed"""
+    parsed_documents = st.session_state.setdefault('parsed_documents', {})
+    others = [other for other in parsed_documents.values() if other is not entry]
+    budget = get_session_memory_budget()
+    
+    # Least recently used documents come first and are released first; text held by
+    # this session's background jobs cannot be released and counts against the rest
+    used = sum(text_memory_bytes(other.get('text')) for other in others)
+    for other in others:
+        if used + budget.reserved + size <= budget.limit:
+            break
+        if isinstance(other.get('text'), str):
+            used -= text_memory_bytes(other.pop('text'))
+    
+    if used + budget.reserved + size > budget.limit:
+        log_warning(f"Document text ({size / MB:.1f} MB) exceeds the session memory budget "
+                    f"({budget.limit / MB:.0f} MB); keeping it on disk")
+        budget.foreground = used
+        return False
+    budget.foreground = used + size
+    return True
+
+def get_session_memory_budget():
+    """Get this session's memory budget, refreshed with the text the session holds"""
+    budget = st.session_state.setdefault('memory_budget', MemoryBudget(SESSION_MEMORY_BUDGET_BYTES))
+    parsed_documents = st.session_state.get('parsed_documents', {})
+    budget.foreground = sum(text_memory_bytes(entry.get('text')) for entry in parsed_documents.values())
+    return budget
+
+def get_session_memory_usage():
+    """Report memory held for this session's documents and jobs against the budget"""
+    parsed_documents = st.session_state.get('parsed_documents', {})
+    texts = [entry.get('text') for entry in parsed_documents.values()]
+    budget = get_session_memory_budget()
+    return {
+        'text_bytes': budget.foreground + budget.reserved,
+        'disk_bytes': sum(text.disk_bytes for text in texts if text is not None and not isinstance(text, str)),
+        'budget_bytes': budget.limit
+    }
+
 def is_supported_file_type(filename):
     """Check if file type is supported"""
     supported_extensions = ['pdf', 'doc', 'docx', 'txt', 'md', 'markdown']
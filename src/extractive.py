@@ -0,0 +1,149 @@
+import re
+import numpy as np
+from utils.helpers import tokens_to_chars
+from utils.logger import log_info, log_warning
+
+# Hashed TF-IDF feature count; bounds memory at sentences x features floats
+MAX_FEATURES = 2048
+
+# Characters at the start kept verbatim: title, authors and abstract live there
+LEAD_CHARS = 2000
+
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_ITERATIONS = 30
+
+SENTENCE_PATTERN = re.compile(r"[^.!?\n]+(?:[.!?]+|\n|$)")
+WORD_PATTERN = re.compile(r"[a-z][a-z0-9\-]{2,}")
+
+STOPWORDS = frozenset("""
+the and for are but not you all any can had her was one our out has have this that with from they
+will would there their what about which when make like time just know take into year your some could
+them than then now look only come its over think also back after use two how first well way even new
+want because these give most such were been more other here where those through while each very
+""".split())
+
+
+def split_sentences(text):
+    """Split text into sentence (start, end) spans"""
+    spans = []
+    for match in SENTENCE_PATTERN.finditer(text):
+        start, end = match.span()
+        # Skip whitespace-only fragments between paragraphs
+        if text[start:end].strip():
+            spans.append((start, end))
+    return spans
+
+
+def tfidf_matrix(sentences):
+    """Build an L2-normalized, hashed TF-IDF matrix with one row per sentence"""
+    rows = []
+    words = []
+    for i, sentence in enumerate(sentences):
+        tokens = [token for token in WORD_PATTERN.findall(sentence.lower()) if token not in STOPWORDS]
+        rows.extend([i] * len(tokens))
+        words.extend(tokens)
+    
+    matrix = np.zeros((len(sentences), MAX_FEATURES), dtype=np.float32)
+    if not words:
+        return matrix
+    
+    # Map words to vocabulary ids, folding large vocabularies into MAX_FEATURES columns
+    _, word_ids = np.unique(np.array(words), return_inverse=True)
+    np.add.at(matrix, (np.array(rows), word_ids % MAX_FEATURES), 1.0)
+    
+    document_frequency = np.count_nonzero(matrix, axis=0)
+    idf = np.log((1 + len(sentences)) / (1 + document_frequency)) + 1
+    matrix = np.log1p(matrix) * idf
+    
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def textrank_scores(matrix):
+    """Score sentences by TextRank over cosine similarity, without building the n x n matrix
+    
+    With row-normalized features X the similarity matrix is S = X X^T, so each power
+    iteration step S D^-1 p is computed as X (X^T (p / d)) in O(sentences x features).
+    """
+    sentence_count = matrix.shape[0]
+    if sentence_count == 0:
+        return np.zeros(0, dtype=np.float32)
+    
+    # Row sums of S minus the self-similarity on the diagonal
+    degrees = matrix @ matrix.sum(axis=0) - np.einsum("ij,ij->i", matrix, matrix)
+    degrees = np.maximum(degrees, 1e-12)
+    
+    scores = np.full(sentence_count, 1.0 / sentence_count, dtype=np.float32)
+    for _ in range(TEXTRANK_ITERATIONS):
+        weighted = scores / degrees
+        spread = matrix @ (matrix.T @ weighted) - weighted * np.einsum("ij,ij->i", matrix, matrix)
+        scores = (1 - TEXTRANK_DAMPING) / sentence_count + TEXTRANK_DAMPING * spread
+    return scores
+
+
+def select_sentences(text, max_chars):
+    """Pick the most central sentences fitting max_chars, returned as spans in document order"""
+    spans = split_sentences(text)
+    lead = [(start, end) for start, end in spans if end <= LEAD_CHARS]
+    rest = [(start, end) for start, end in spans if end > LEAD_CHARS]
+    
+    budget = max_chars - sum(end - start for start, end in lead)
+    if not rest or budget <= 0:
+        return lead
+    
+    scores = textrank_scores(tfidf_matrix([text[start:end] for start, end in rest]))
+    # Count two characters per sentence for the separators added by join_spans
+    lengths = np.array([end - start + 2 for start, end in rest])
+    
+    # Take sentences in score order, skipping any that no longer fit so one long
+    # sentence does not crowd out everything ranked below it
+    chosen = []
+    for i in np.argsort(-scores, kind="stable"):
+        if lengths[i] <= budget:
+            chosen.append(i)
+            budget -= lengths[i]
+    return lead + [rest[i] for i in sorted(chosen)]
+
+
+def join_spans(text, spans):
+    """Join sentence spans, keeping a paragraph break wherever the original had one"""
+    parts = []
+    previous_end = None
+    for start, end in spans:
+        if previous_end is not None:
+            parts.append("\n\n" if "\n" in text[previous_end:start] or start != previous_end else " ")
+        parts.append(text[start:end].strip())
+        previous_end = end
+    return "".join(parts)
+
+
+def compress_text(text, target_ratio=0.5, token_budget=None):
+    """Keep the most central sentences up to target_ratio of the text (or a token budget)"""
+    max_chars = int(len(text) * target_ratio)
+    if token_budget:
+        max_chars = min(max_chars, tokens_to_chars(token_budget))
+    if len(text) <= max_chars:
+        return text
+    
+    compressed = join_spans(text, select_sentences(text, max_chars))
+    if not compressed.strip():
+        # No sentence fits (e.g. unpunctuated text), so truncate rather than send nothing
+        log_warning("Extractive compression selected no sentences; truncating instead")
+        compressed = text[:max_chars]
+    log_info(f"Extractive compression: {len(text)} -> {len(compressed)} characters "
+             f"({len(compressed) / len(text):.0%})")
+    return compressed
+
+
+def extractive_summary(text, max_sentences=15):
+    """Build an instant, LLM-free summary from the most central sentences"""
+    spans = split_sentences(text)
+    if not spans:
+        return ""
+    
+    scores = textrank_scores(tfidf_matrix([text[start:end] for start, end in spans]))
+    chosen = np.sort(np.argsort(-scores, kind="stable")[:max_sentences])
+    bullets = "\n".join(f"- {' '.join(text[spans[i][0]:spans[i][1]].split())}" for i in chosen)
+    
+    log_info(f"Extractive summary: {len(chosen)} of {len(spans)} sentences")
+    return f"**KEY SENTENCES** (extractive, no AI)\n\n{bullets}"
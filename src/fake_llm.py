@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class FakeLLMError(Exception):
+    """Simulated API failure raised by FakeChatLLM"""
+
+
+class FakeChatLLM:
+    """Deterministic offline stand-in for ChatGoogleGenerativeAI
+    
+    Implements the `invoke(messages)` interface used by the pipeline. Output text is
+    derived from a hash of the input, so identical prompts give identical summaries.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.1, error_rate=0.0, output_chars=1500,
+                 rate_limit_errors=False, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.output_chars = output_chars
+        self.rate_limit_errors = rate_limit_errors
+        self.calls = 0
+        self.input_chars = 0
+        self.output_chars_total = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _next_call(self, prompt_chars):
+        """Record a call and draw its latency and failure outcome"""
+        with self._lock:
+            self.calls += 1
+            self.input_chars += prompt_chars
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fails = self._random.random() < self.error_rate
+        return delay, fails
+
+    def _make_content(self, prompt):
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        words = [digest[i:i + 8] for i in range(0, len(digest), 8)]
+        line = f"**KEY FINDINGS**: {' '.join(words)}\n"
+        return (line * (self.output_chars // len(line) + 1))[:self.output_chars]
+
+    def _raise_error(self):
+        if self.rate_limit_errors:
+            raise FakeLLMError("429 Resource has been exhausted (simulated quota error)")
+        raise FakeLLMError("500 Internal error (simulated)")
+
+    def invoke(self, messages):
+        prompt = "\n".join(message.content for message in messages)
+        delay, fails = self._next_call(len(prompt))
+        time.sleep(delay)
+        if fails:
+            self._raise_error()
+        
+        content = self._make_content(prompt)
+        with self._lock:
+            self.output_chars_total += len(content)
+        return AIMessage(content=content)
+
+    async def ainvoke(self, messages):
+        prompt = "\n".join(message.content for message in messages)
+        delay, fails = self._next_call(len(prompt))
+        await asyncio.sleep(delay)
+        if fails:
+            self._raise_error()
+        
+        content = self._make_content(prompt)
+        with self._lock:
+            self.output_chars_total += len(content)
+        return AIMessage(content=content)
+
+    def stream(self, messages, piece_chars=40):
+        """Yield the same content as invoke in small pieces, spreading the latency across them"""
+        prompt = "\n".join(message.content for message in messages)
+        delay, fails = self._next_call(len(prompt))
+        if fails:
+            time.sleep(delay)
+            self._raise_error()
+        
+        content = self._make_content(prompt)
+        pieces = [content[i:i + piece_chars] for i in range(0, len(content), piece_chars)]
+        for piece in pieces:
+            time.sleep(delay / len(pieces))
+            yield AIMessageChunk(content=piece)
+        with self._lock:
+            self.output_chars_total += len(content)
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls = 0
+            self.input_chars = 0
+            self.output_chars_total = 0
@@ -0,0 +1,308 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from src.document_processor import ExtractionStream, extract_text_from_document, extract_mapped_file_to_disk
+from src.extractive import compress_text, extractive_summary
+from src.llm_handler import (initialize_chat_llm, process_document, process_document_stream,
+                             SUMMARY_MODEL_ID, MODEL_TEMPERATURE, MAP_PROMPT_VERSION)
+from src.sections import split_sections, iter_filtered_sections
+from src.spool import (MappedFile, SpooledText, spool_temp_copy, spool_text, text_memory_bytes,
+                       SPOOL_THRESHOLD_BYTES)
+from src.summary_cache import make_cache_key, get_cached_summary, store_summary
+from utils.logger import log_info, log_error, log_warning, set_log_context, bind_log_context
+from utils.metrics import stage_timer, write_metrics_file
+
+# Documents processed concurrently in the background, across all sessions; LLM calls
+# are additionally capped process-wide by the rate limiter
+JOB_WORKERS = int(os.getenv("SUMMARY_JOB_WORKERS", "8"))
+
+# Seconds a finished job stays available for sessions to reattach to
+JOB_RETENTION_SECONDS = 3600
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class SummaryJob:
+    """State of a background summarization, shared with any session that attaches to it"""
+
+    def __init__(self, job_key, name):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = job_key
+        self.name = name
+        self.status = JOB_QUEUED
+        self.percent = 0
+        self.message = "Waiting for a free worker..."
+        self.partial_summary = ""
+        self.summary = None
+        self.error = None
+        self.characters = 0
+        self.cached = False
+        self.created = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+
+class JobProgress:
+    """Stands in for the progress bar and status widgets process_document expects"""
+
+    def __init__(self, job):
+        self.job = job
+
+    def progress(self, percent):
+        self.job.percent = percent
+
+    def text(self, message):
+        self.job.message = message
+
+    markdown = text
+
+    def stream(self, partial_text):
+        self.job.partial_summary = partial_text
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_executor = None
+
+
+def make_job_key(file_hash, settings):
+    """Identify a job by document content hash and processing settings"""
+    return file_hash + "".join(f":{key}={value}" for key, value in sorted(settings.items()))
+
+
+def _prune_finished_jobs():
+    """Drop finished jobs past their retention period (caller holds the lock)"""
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    for key in [key for key, job in _jobs.items() if job.finished and job.finished_at < cutoff]:
+        del _jobs[key]
+
+
+def get_summary_job(job_key):
+    """Get the job for a document and settings, if one was submitted"""
+    with _jobs_lock:
+        return _jobs.get(job_key)
+
+
+def _submit_job(job_key, name, worker, *args):
+    """Run worker(job, *args) on the shared pool, or return the live job with the same key"""
+    global _executor
+    with _jobs_lock:
+        _prune_finished_jobs()
+        existing = _jobs.get(job_key)
+        if existing and existing.status != JOB_FAILED:
+            log_info(f"Reusing summary job {existing.id} for {name}")
+            return existing
+        
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="summary-job")
+        
+        job = SummaryJob(job_key, name)
+        _jobs[job_key] = job
+        _executor.submit(bind_log_context(worker), job, *args)
+        log_info(f"Submitted summary job {job.id} for {name}")
+        return job
+
+
+def submit_summary_job(job_key, name, text, token_budget, chunk_overlap, cache_key, sections=None):
+    """Start summarizing in the background, or return the existing job for the same key"""
+    return _submit_job(job_key, name, _run_summary_job, text, token_budget, chunk_overlap, cache_key, sections)
+
+
+def submit_document_job(job_key, uploaded_file, file_hash, settings, instant=False, memory_budget=None):
+    """Extract, pre-process and summarize an upload in the background, or return the existing job
+    
+    The job works from its own spooled copy of the upload, and text it holds in memory is
+    reserved from memory_budget (spooled to disk when it does not fit).
+    """
+    existing = get_summary_job(job_key)
+    if existing and existing.status != JOB_FAILED:
+        log_info(f"Reusing summary job {existing.id} for {uploaded_file.name}")
+        return existing
+    
+    path = spool_temp_copy(uploaded_file)
+    return _submit_job(job_key, uploaded_file.name, _run_document_job, path, file_hash,
+                       settings, instant, memory_budget)
+
+
+def make_document_cache_key(file_hash, token_budget, chunk_overlap, excluded_sections=(), compression_ratio=1.0):
+    """Key a document's summary by upload content hash and the pre-stages actually applied
+    
+    The key does not depend on the extracted text, so a cached summary is found before
+    extraction starts and summarization can run while the text is still being extracted.
+    """
+    source = f"upload:{file_hash}|skip={','.join(sorted(excluded_sections))}|ratio={compression_ratio}"
+    return make_cache_key(source, SUMMARY_MODEL_ID, MODEL_TEMPERATURE, MAP_PROMPT_VERSION,
+                          token_budget, chunk_overlap)
+
+
+def prepare_llm_text(text, settings, file_hash):
+    """Apply the section-skipping and pre-compression pre-stages, returning (llm_text, sections, cache_key)
+    
+    sections are those of llm_text, for the chunker, or None when they are not known.
+    Text spooled to disk is passed through unchanged, since both pre-stages need it in memory.
+    """
+    sections = None
+    if isinstance(text, str):
+        excluded_sections = settings['excluded_sections']
+        compression_ratio = settings['compression_ratio']
+        llm_text, sections = split_sections(text, excluded_sections)
+        if compression_ratio < 1.0:
+            llm_text = compress_text(llm_text, compression_ratio)
+            sections = None
+    else:
+        llm_text = text
+        excluded_sections, compression_ratio = (), 1.0
+    
+    cache_key = make_document_cache_key(file_hash, settings['token_budget'], settings['chunk_overlap'],
+                                        excluded_sections, compression_ratio)
+    return llm_text, sections, cache_key
+
+
+@contextmanager
+def _job_running(job):
+    """Mark a job running for the duration of the block, then record its outcome on the job"""
+    job.status = JOB_RUNNING
+    start_time = time.time()
+    set_log_context(job=job.id, document=job.name)
+    
+    try:
+        with stage_timer("document") as span:
+            yield span
+            span.output_chars = len(job.summary)
+        job.percent = 100
+        job.status = JOB_DONE
+        log_info(f"Summary job {job.id} completed in {time.time() - start_time:.2f} seconds")
+    except Exception as e:
+        log_error(f"Summary job {job.id} failed: {str(e)}")
+        job.error = str(e)
+        job.status = JOB_FAILED
+    finally:
+        job.finished_at = time.time()
+        try:
+            write_metrics_file()
+        except OSError as e:
+            log_error(f"Failed to write metrics file: {str(e)}")
+
+
+def _summarize_into_job(job, text, token_budget, chunk_overlap, cache_key, sections=None):
+    """Run the summarization pipeline, storing the result on the job and in the cache"""
+    job.percent = 25
+    job.message = "Analyzing document structure and content..."
+    
+    llm = initialize_chat_llm(stage="reduce")
+    map_llm = initialize_chat_llm(stage="map")
+    if not llm or not map_llm:
+        raise RuntimeError("Failed to initialize the AI model. Please check your API key in .env file.")
+    
+    progress = JobProgress(job)
+    if isinstance(text, str):
+        summary = process_document(text, llm, token_budget, chunk_overlap,
+                                   progress, progress, on_token=progress.stream, map_llm=map_llm,
+                                   sections=sections)
+    else:
+        # Text spooled to disk, or still being extracted, is streamed to the chunker
+        blocks = text.iter_blocks() if isinstance(text, SpooledText) else text
+        summary = process_document_stream(blocks, llm, token_budget, chunk_overlap,
+                                          progress, progress, on_token=progress.stream, map_llm=map_llm)
+    if not summary:
+        raise RuntimeError("Failed to generate summary. Please try again.")
+    
+    store_summary(cache_key, summary)
+    job.summary = summary
+
+
+def _run_summary_job(job, text, token_budget, chunk_overlap, cache_key, sections=None):
+    """Worker body: run the pipeline, recording progress and the result on the job"""
+    with _job_running(job) as span:
+        span.input_chars = job.characters = len(text)
+        _summarize_into_job(job, text, token_budget, chunk_overlap, cache_key, sections)
+
+
+def _run_document_job(job, path, file_hash, settings, instant, memory_budget=None):
+    """Worker body: serve a spooled upload from the cache, or extract and summarize it"""
+    text = None
+    reserved = 0
+    try:
+        with _job_running(job) as span, MappedFile(path, job.name) as document_file:
+            if not instant and settings['compression_ratio'] >= 1.0:
+                _stream_document_into_job(job, span, document_file, file_hash, settings)
+                return
+            
+            job.percent = 5
+            job.message = "Extracting text..."
+            # Spooled text is named per job so concurrent jobs on the same document never share it
+            text_key = f"{file_hash}-{job.id}"
+            if document_file.size >= SPOOL_THRESHOLD_BYTES:
+                text = extract_mapped_file_to_disk(document_file, text_key)
+            else:
+                text = extract_text_from_document(document_file)
+                if text and memory_budget:
+                    size = text_memory_bytes(text)
+                    if memory_budget.reserve(size):
+                        reserved = size
+                    else:
+                        log_warning(f"Text of {job.name} does not fit the session memory budget; "
+                                    "processing it from disk")
+                        text = spool_text([text], text_key)
+            if not text:
+                raise RuntimeError("Failed to extract text from document.")
+            span.input_chars = job.characters = len(text)
+            
+            if instant:
+                if not isinstance(text, str):
+                    raise RuntimeError("Document is too large for an instant summary; use AI summary.")
+                job.summary = extractive_summary(text)
+                return
+            
+            llm_text, sections, cache_key = prepare_llm_text(text, settings, file_hash)
+            job.summary = get_cached_summary(cache_key)
+            if job.summary:
+                job.cached = True
+                return
+            _summarize_into_job(job, llm_text, settings['token_budget'], settings['chunk_overlap'],
+                                cache_key, sections)
+    finally:
+        if reserved:
+            memory_budget.release(reserved)
+        _remove_spool_file(path)
+        if text is not None and not isinstance(text, str):
+            _remove_spool_file(text.path)
+
+
+def _stream_document_into_job(job, span, document_file, file_hash, settings):
+    """Summarize a document while it is extracted; section skipping is the only pre-stage that streams"""
+    cache_key = make_document_cache_key(file_hash, settings['token_budget'], settings['chunk_overlap'],
+                                        settings['excluded_sections'])
+    job.summary = get_cached_summary(cache_key)
+    if job.summary:
+        job.cached = True
+        return
+    
+    job.percent = 5
+    job.message = "Extracting text..."
+    stream = ExtractionStream(document_file)
+    try:
+        _summarize_into_job(job, iter_filtered_sections(stream, settings['excluded_sections']),
+                            settings['token_budget'], settings['chunk_overlap'], cache_key)
+    except RuntimeError:
+        if stream.finished and not stream.characters:
+            raise RuntimeError("Failed to extract text from document.")
+        raise
+    finally:
+        span.input_chars = job.characters = stream.characters
+
+
+def _remove_spool_file(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        log_warning(f"Could not remove spool file {path}: {str(e)}")
@@ -1,42 +1,290 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import chain
+import math
+import os
 import time
-from utils.logger import log_info, log_error, log_warning
+from src.llm_pool import get_chat_llm
+from src.sections import detect_sections
+from src.summary_cache import make_chunk_cache_key, get_cached_summary, store_summary
+from src.rate_limiter import get_rate_limiter, is_rate_limit_error
+from utils.helpers import estimate_tokens, tokens_to_chars
+from utils.logger import log_info, log_error, log_warning, bind_log_context
+from utils.metrics import record_stage, record_retry, stage_timer
 
-def initialize_chat_llm():
-    """Initialize ChatGoogleGenerativeAI silently"""
+# Maximum number of chunk summaries in flight at once during the map phase
+MAX_CONCURRENT_CHUNKS = int(os.getenv("MAX_CONCURRENT_CHUNKS", "4"))
+
+# Estimated input tokens per map call; documents within budget are summarized in one call
+CALL_TOKEN_BUDGET = int(os.getenv("CALL_TOKEN_BUDGET", "100000"))
+
+# Estimated tokens taken by the system message and instructions in each chunk prompt
+PROMPT_OVERHEAD_TOKENS = 300
+
+# Separators tried in priority order when choosing a chunk boundary
+CHUNK_SEPARATORS = ["\n\n", "\n", ". ", " "]
+
+SECTION_BREAK = "\n\n---SECTION BREAK---\n\n"
+
+# Estimated-token budget for the combined summaries in a single reduce prompt
+REDUCE_TOKEN_BUDGET = int(os.getenv("REDUCE_TOKEN_BUDGET", "30000"))
+
+# LLM backend: "gemini" for the live API, "fake" for the offline deterministic stand-in
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+# Model settings; bump PROMPT_VERSION whenever prompt wording changes
+MODEL_NAME = "gemini-2.0-flash"
+MODEL_TEMPERATURE = 0.2
+PROMPT_VERSION = "1"
+
+# Per-stage model settings: map calls are many and only feed the reduce prompt, so they can
+# use a cheaper model and a tighter output cap than the reduce/single-pass call users read
+STAGE_MODELS = {
+    "map": {
+        "model": os.getenv("MAP_MODEL", MODEL_NAME),
+        "max_output_tokens": int(os.getenv("MAP_MAX_OUTPUT_TOKENS", "2048")),
+        "timeout": float(os.getenv("MAP_TIMEOUT_SECONDS", "120")),
+    },
+    "reduce": {
+        "model": os.getenv("REDUCE_MODEL", MODEL_NAME),
+        "max_output_tokens": int(os.getenv("REDUCE_MAX_OUTPUT_TOKENS", "8192")),
+        "timeout": float(os.getenv("REDUCE_TIMEOUT_SECONDS", "300")),
+    },
+}
+
+# Map prompt profile: "full" eight-section summaries, or "lite" terse bullet notes that are
+# quicker to generate and keep the reduce prompt small
+MAP_PROFILE = os.getenv("MAP_PROFILE", "full")
+MAP_PROFILES = ("full", "lite")
+if MAP_PROFILE not in MAP_PROFILES:
+    log_warning(f"Unknown MAP_PROFILE {MAP_PROFILE!r}; expected one of {', '.join(MAP_PROFILES)}. Using 'full'")
+    MAP_PROFILE = "full"
+
+# Identifiers for cache keys, so changing the backend, a stage model or the map profile never
+# reuses old summaries (offline fake output must never be served as a real summary)
+MAP_PROMPT_VERSION = f"{PROMPT_VERSION}-{MAP_PROFILE}"
+MAP_MODEL_ID = f"{LLM_BACKEND}/{STAGE_MODELS['map']['model']}"
+SUMMARY_MODEL_ID = f"{LLM_BACKEND}/{STAGE_MODELS['map']['model']}+{STAGE_MODELS['reduce']['model']}"
+
+# Retries after a quota/429 error, on top of the client's own retries
+RATE_LIMIT_RETRIES = 3
+RATE_LIMIT_BACKOFF_SECONDS = 2
+
+def initialize_chat_llm(backend=None, stage=None):
+    """Get the shared ChatGoogleGenerativeAI client silently, configured for a pipeline stage if given"""
+    backend = backend or LLM_BACKEND
+    if backend == "fake":
+        from src.fake_llm import FakeChatLLM
+        log_info("Using offline FakeChatLLM backend")
+        if stage:
+            return FakeChatLLM(output_chars=min(1500, tokens_to_chars(STAGE_MODELS[stage]["max_output_tokens"])))
+        return FakeChatLLM()
+    
     try:
-        log_info("Initializing ChatGoogleGenerativeAI")
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            temperature=0.2,
-            max_retries=3
-        )
-        log_info("ChatGoogleGenerativeAI initialized successfully")
+        if stage:
+            config = STAGE_MODELS[stage]
+            llm = get_chat_llm(config["model"], MODEL_TEMPERATURE, max_retries=3,
+                               max_output_tokens=config["max_output_tokens"], timeout=config["timeout"])
+            log_info(f"ChatGoogleGenerativeAI ready for {stage} stage ({config['model']})")
+        else:
+            llm = get_chat_llm(MODEL_NAME, MODEL_TEMPERATURE, max_retries=3)
+            log_info("ChatGoogleGenerativeAI ready")
         return llm
     except Exception as e:
         log_error(f"Failed to initialize ChatGoogleGenerativeAI: {str(e)}")
         return None
 
-def chunk_text(text, chunk_size=4000, overlap=500):
-    """Split text into manageable chunks"""
+def stream_response(llm, messages, on_token):
+    """Stream a response, passing the text so far to on_token after each piece"""
+    parts = []
+    for piece in llm.stream(messages):
+        if piece.content:
+            parts.append(piece.content)
+            on_token("".join(parts))
+    return AIMessage(content="".join(parts))
+
+def invoke_with_rate_limit(llm, messages, on_token=None):
+    """Invoke the LLM through the shared rate limiter, backing off on quota errors
+    
+    With on_token, the response is streamed and on_token receives the text so far.
+    """
+    limiter = get_rate_limiter()
+    tokens = sum(estimate_tokens(message.content) for message in messages)
+    
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        limiter.acquire(tokens)
+        throttled = False
+        try:
+            if on_token:
+                response = stream_response(llm, messages, on_token)
+            else:
+                response = llm.invoke(messages)
+        except Exception as e:
+            throttled = is_rate_limit_error(e)
+            if not throttled or attempt == RATE_LIMIT_RETRIES:
+                raise
+        finally:
+            # Also runs for BaseExceptions such as Streamlit's rerun raised from on_token,
+            # which would otherwise leak the process-wide slot
+            limiter.release(throttled=throttled)
+        
+        if not throttled:
+            return response
+        record_retry()
+        backoff = RATE_LIMIT_BACKOFF_SECONDS * (2 ** attempt)
+        log_warning(f"Rate limited, retrying in {backoff} seconds (attempt {attempt + 1}/{RATE_LIMIT_RETRIES})")
+        time.sleep(backoff)
+
+def find_split_point(text, start, chunk_size):
+    """Find where a chunk beginning at start should end, preferring higher-priority separators"""
+    limit = start + chunk_size
+    if len(text) <= limit:
+        return len(text)
+    
+    # Only accept a separator in the back half so chunks don't become tiny
+    min_end = start + chunk_size // 2
+    for separator in CHUNK_SEPARATORS:
+        position = text.rfind(separator, min_end, limit)
+        if position != -1:
+            return position + len(separator)
+    return limit
+
+def next_chunk_start(text, start, end, overlap):
+    """Find where the chunk after [start, end) begins: at most `overlap` characters back,
+    aligned to the highest-priority separator in that window"""
+    next_start = end - overlap
+    for separator in CHUNK_SEPARATORS:
+        position = text.find(separator, next_start, end)
+        if position != -1:
+            next_start = position + len(separator)
+            break
+    # Always move forward, even when the overlap is as large as the chunk
+    return next_start if next_start > start else end
+
+def trim_span(text, start, end):
+    """Narrow [start, end) to exclude surrounding whitespace without copying the text"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+def chunk_boundaries(text, chunk_size=4000, overlap=500):
+    """Split text into overlapping chunks in a single pass, returning (start, end) offsets"""
+    boundaries = []
+    start = 0
+    
+    while start < len(text):
+        end = find_split_point(text, start, chunk_size)
+        
+        chunk_start, chunk_end = trim_span(text, start, end)
+        if chunk_end > chunk_start:
+            boundaries.append((chunk_start, chunk_end))
+        
+        if end >= len(text):
+            break
+        start = next_chunk_start(text, start, end, overlap)
+    
+    return boundaries
+
+def max_chunk_chars(token_budget=CALL_TOKEN_BUDGET):
+    """Largest chunk, in characters, that fits a call's token budget alongside the prompt"""
+    return tokens_to_chars(max(1, token_budget - PROMPT_OVERHEAD_TOKENS))
+
+def plan_chunk_size(text_length, token_budget=CALL_TOKEN_BUDGET, overlap=500):
+    """Pick a chunk size that packs the text into as few calls as the budget allows"""
+    max_chars = max_chunk_chars(token_budget)
+    if text_length <= max_chars:
+        return max_chars
+    
+    # Spread the text evenly over the minimum number of chunks instead of
+    # leaving a small remainder; the slack absorbs separator-aligned early ends
+    step = max(1, max_chars - overlap)
+    chunk_count = math.ceil((text_length - overlap) / step)
+    balanced = math.ceil((text_length - overlap) / chunk_count) + overlap
+    return min(max_chars, int(balanced * 1.1))
+
+def section_chunk_boundaries(text, sections, chunk_size=4000, overlap=500):
+    """Chunk text so boundaries fall on section boundaries wherever possible
+    
+    Consecutive sections are packed into one chunk while they fit; a section longer
+    than chunk_size is split on its own, and its tail can absorb the sections after it.
+    """
+    boundaries = []
+    current = None
+    
+    for _, start, end in sections:
+        if current and end - current[0] <= chunk_size:
+            current = (current[0], end)
+            continue
+        if current:
+            boundaries.append(current)
+        
+        if end - start <= chunk_size:
+            current = (start, end)
+        else:
+            parts = [(start + part_start, start + part_end)
+                     for part_start, part_end in chunk_boundaries(text[start:end], chunk_size, overlap)]
+            boundaries.extend(parts[:-1])
+            current = parts[-1] if parts else None
+    
+    if current:
+        boundaries.append(current)
+    
+    trimmed = [trim_span(text, start, end) for start, end in boundaries]
+    return [(start, end) for start, end in trimmed if end > start]
+
+def chunk_text(text, chunk_size=4000, overlap=500, section_aware=True, sections=None):
+    """Split text into manageable chunks, aligned to section headings by default
+    
+    Pass sections already detected on text (e.g. by split_sections) to skip detecting them again.
+    """
     log_info(f"Chunking text: {len(text)} characters into chunks of {chunk_size} with {overlap} overlap")
     
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
-    chunks = text_splitter.split_text(text)
+    with stage_timer("chunking", input_chars=len(text)) as span:
+        if not section_aware:
+            sections = []
+        elif sections is None:
+            sections = detect_sections(text)
+        if len(sections) > 1:
+            log_info(f"Aligning chunks to {len(sections)} sections: {', '.join(name for name, _, _ in sections)}")
+            boundaries = section_chunk_boundaries(text, sections, chunk_size, overlap)
+        else:
+            boundaries = chunk_boundaries(text, chunk_size, overlap)
+        chunks = [text[start:end] for start, end in boundaries]
+        span.output_chars = sum(len(chunk) for chunk in chunks)
     
     log_info(f"Text split into {len(chunks)} chunks")
     return chunks
 
-def summarize_text_chunk(llm, text, chunk_num=None):
-    """Summarize a single text chunk"""
-    chunk_info = f" (chunk {chunk_num})" if chunk_num else ""
-    log_info(f"Starting summarization{chunk_info} - {len(text)} characters")
+def iter_text_chunks(blocks, chunk_size=4000, overlap=500):
+    """Yield overlapping chunks from a stream of text blocks as soon as enough text has arrived"""
+    buffer = ""
+    chunk_count = 0
+    
+    for block in chain(blocks, [None]):
+        final = block is None
+        if not final:
+            buffer += block
+        
+        # Only the last buffered chunk may be shorter than chunk_size
+        while len(buffer) > chunk_size or (final and buffer.strip()):
+            end = find_split_point(buffer, 0, chunk_size)
+            chunk = buffer[:end].strip()
+            if chunk:
+                chunk_count += 1
+                yield chunk
+            if end >= len(buffer):
+                buffer = ""
+                break
+            buffer = buffer[next_chunk_start(buffer, 0, end, overlap):]
+    
+    log_info(f"Streamed text into {chunk_count} chunks")
+
+def build_chunk_messages(text, profile="full"):
+    """Build the prompt for summarizing one chunk (or a whole single-pass document)"""
+    if profile == "lite":
+        return build_lite_chunk_messages(text)
     
     messages = [
         SystemMessage(content="""You are an expert academic researcher. Create comprehensive, well-structured summaries of research papers that help readers understand key concepts, methodology, findings, and implications."""),
@@ -54,25 +302,22 @@ def summarize_text_chunk(llm, text, chunk_num=None):
 Text to summarize:
 {text}""")
     ]
-    
-    try:
-        start_time = time.time()
-        response = llm.invoke(messages)
-        end_time = time.time()
-        
-        log_info(f"Summarization completed{chunk_info} in {end_time - start_time:.2f} seconds")
-        log_info(f"Generated summary{chunk_info}: {len(response.content)} characters")
-        
-        return response.content
-    except Exception as e:
-        log_error(f"Error generating summary{chunk_info}: {str(e)}")
-        return None
+    return messages
 
-def create_final_summary(llm, chunk_summaries):
-    """Combine multiple chunk summaries into a final comprehensive summary"""
-    log_info(f"Creating final summary from {len(chunk_summaries)} chunk summaries")
-    
-    combined_text = "\n\n---SECTION BREAK---\n\n".join(chunk_summaries)
+def build_lite_chunk_messages(text):
+    """Build the map prompt for the lite profile: terse notes for the reduce step, not a finished summary"""
+    messages = [
+        SystemMessage(content="""You are an expert academic researcher taking notes on one section of a research paper. Another step will combine your notes, so be terse."""),
+        HumanMessage(content=f"""Write at most 12 short bullet notes on this document text. Each note should be under 25 words. Cover, where present: title and authors, objectives, methods, key findings with their numbers, conclusions and limitations. No headings, no introduction, no repetition.
+
+Text:
+{text}""")
+    ]
+    return messages
+
+def build_final_messages(chunk_summaries):
+    """Build the prompt for synthesizing chunk summaries into one summary"""
+    combined_text = SECTION_BREAK.join(chunk_summaries)
     
     messages = [
         SystemMessage(content="""You are an expert academic researcher. Your task is to synthesize multiple section summaries into one comprehensive, coherent final summary."""),
@@ -90,28 +335,200 @@ def create_final_summary(llm, chunk_summaries):
 Section summaries to synthesize:
 {combined_text}""")
     ]
+    return messages
+
+def build_question_messages(question, excerpts):
+    """Build the prompt for answering a question from retrieved document excerpts"""
+    numbered = SECTION_BREAK.join(f"[{i}] {excerpt}" for i, excerpt in enumerate(excerpts, start=1))
+    messages = [
+        SystemMessage(content="""You are an expert academic researcher. Answer questions about a research paper using only the excerpts provided. If the excerpts do not contain the answer, say so."""),
+        HumanMessage(content=f"""Answer the question below from these excerpts of the document. Be concise and cite the excerpts you used by number, e.g. [2].
+
+Excerpts:
+{numbered}
+
+Question: {question}""")
+    ]
+    return messages
+
+def summarize_text_chunk(llm, text, chunk_num=None, on_token=None, profile="full"):
+    """Summarize a single text chunk, streaming partial output to on_token if given"""
+    chunk_info = f" (chunk {chunk_num})" if chunk_num else ""
+    log_info(f"Starting summarization{chunk_info} - {len(text)} characters")
+    
+    messages = build_chunk_messages(text, profile)
+    stage = "map" if chunk_num else "single_pass"
+    
+    start_time = time.time()
+    try:
+        response = invoke_with_rate_limit(llm, messages, on_token)
+        end_time = time.time()
+        
+        log_info(f"Summarization completed{chunk_info} in {end_time - start_time:.2f} seconds")
+        log_info(f"Generated summary{chunk_info}: {len(response.content)} characters")
+        record_stage(stage, end_time - start_time, len(text), len(response.content))
+        
+        return response.content
+    except Exception as e:
+        log_error(f"Error generating summary{chunk_info}: {str(e)}")
+        record_stage(stage, time.time() - start_time, len(text), error=True)
+        return None
+
+def create_final_summary(llm, chunk_summaries, on_token=None):
+    """Combine multiple chunk summaries into a final comprehensive summary"""
+    log_info(f"Creating final summary from {len(chunk_summaries)} chunk summaries")
     
+    messages = build_final_messages(chunk_summaries)
+    input_chars = sum(len(summary) for summary in chunk_summaries)
+    
+    start_time = time.time()
     try:
-        start_time = time.time()
-        response = llm.invoke(messages)
+        response = invoke_with_rate_limit(llm, messages, on_token)
         end_time = time.time()
         
         log_info(f"Final summary creation completed in {end_time - start_time:.2f} seconds")
         log_info(f"Final summary length: {len(response.content)} characters")
+        record_stage("reduce", end_time - start_time, input_chars, len(response.content))
         
         return response.content
     except Exception as e:
         log_error(f"Error creating final summary: {str(e)}")
+        record_stage("reduce", time.time() - start_time, input_chars, error=True)
         return None
 
-def process_document(text, llm, chunk_size=4000, chunk_overlap=500, 
-                    progress_bar=None, status_text=None):
-    """Process the entire document and generate summary with progress updates"""
+def batch_summaries(summaries, token_budget=REDUCE_TOKEN_BUDGET):
+    """Group consecutive summaries into batches whose combined size fits the token budget"""
+    batches = []
+    current = []
+    current_tokens = 0
+    separator_tokens = estimate_tokens(SECTION_BREAK)
+    
+    for summary in summaries:
+        tokens = estimate_tokens(summary) + separator_tokens
+        if current and current_tokens + tokens > token_budget:
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(summary)
+        current_tokens += tokens
+    
+    if current:
+        batches.append(current)
+    
+    # Always merge at least pairs so every level shrinks the list
+    if len(batches) == len(summaries) and len(summaries) > 1:
+        batches = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+    return batches
+
+def reduce_summaries(llm, summaries, token_budget=REDUCE_TOKEN_BUDGET,
+                     max_concurrency=MAX_CONCURRENT_CHUNKS, on_token=None):
+    """Tree-reduce summaries level by level until one final summary remains"""
+    level = 0
+    
+    while len(summaries) > 1:
+        total_tokens = sum(estimate_tokens(summary) for summary in summaries)
+        if total_tokens <= token_budget:
+            break
+        
+        level += 1
+        batches = batch_summaries(summaries, token_budget)
+        log_info(f"Reduce level {level}: {len(summaries)} summaries ({total_tokens} est. tokens) "
+                 f"-> {len(batches)} batches, fan-out up to {max(len(batch) for batch in batches)}")
+        
+        max_workers = max(1, min(max_concurrency, len(batches)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="reduce") as executor:
+            results = list(executor.map(bind_log_context(lambda batch: create_final_summary(llm, batch)), batches))
+        
+        reduced = [result for result in results if result]
+        if len(reduced) < len(results):
+            log_warning(f"Reduce level {level}: {len(results) - len(reduced)} batches failed")
+        if not reduced:
+            log_error(f"Reduce level {level} produced no summaries")
+            return None
+        summaries = reduced
+    
+    log_info(f"Final reduce over {len(summaries)} summaries after {level} intermediate levels")
+    return create_final_summary(llm, summaries, on_token)
+
+def summarize_chunks(llm, chunks, max_concurrency=MAX_CONCURRENT_CHUNKS, on_chunk_done=None,
+                     use_cache=True):
+    """Summarize chunks concurrently, returning summaries in chunk order (None for failures)
+    
+    `chunks` may be any iterable, including a generator that is still extracting text;
+    it is consumed as chunks are produced with at most `max_concurrency` in flight.
+    """
+    summaries = []
+    in_flight = {}
+    completed = 0
+    reused = 0
+    max_workers = max(1, max_concurrency)
+    
+    def collect(done):
+        nonlocal completed
+        for future in done:
+            i, cache_key = in_flight.pop(future)
+            try:
+                summaries[i] = future.result()
+            except Exception as e:
+                log_error(f"Unexpected error in chunk {i+1}: {str(e)}")
+            
+            if summaries[i]:
+                log_info(f"Chunk {i+1} processed successfully")
+                if cache_key:
+                    store_summary(cache_key, summaries[i])
+            else:
+                log_warning(f"Failed to process chunk {i+1}")
+            
+            completed += 1
+            if on_chunk_done:
+                on_chunk_done(completed, len(summaries))
+    
+    log_info(f"Summarizing chunks with up to {max_workers} in flight")
+    
+    # Progress is reported from the calling thread in completion order
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chunk-summary") as executor:
+        for i, chunk in enumerate(chunks):
+            summaries.append(None)
+            
+            # Reuse memoized summaries so only new or changed chunks reach the LLM
+            cache_key = None
+            if use_cache:
+                cache_key = make_chunk_cache_key(chunk, MAP_MODEL_ID, MODEL_TEMPERATURE, MAP_PROMPT_VERSION)
+                summaries[i] = get_cached_summary(cache_key)
+            if summaries[i]:
+                completed += 1
+                reused += 1
+                if on_chunk_done:
+                    on_chunk_done(completed, len(summaries))
+                continue
+            
+            while len(in_flight) >= max_workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight[executor.submit(bind_log_context(summarize_text_chunk), llm, chunk, i + 1,
+                                      profile=MAP_PROFILE)] = (i, cache_key)
+        
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+    
+    log_info(f"Map phase finished: {len(summaries)} chunks, {reused} reused from cache")
+    return summaries
+
+def process_document(text, llm, token_budget=CALL_TOKEN_BUDGET, chunk_overlap=500, 
+                    progress_bar=None, status_text=None,
+                    max_concurrency=MAX_CONCURRENT_CHUNKS, on_token=None, map_llm=None, sections=None):
+    """Process the entire document and generate summary with progress updates
     
-    log_info("Starting document processing")
+    on_token, if given, receives the final summary text as it streams in. `llm` writes the
+    final (reduce or single-pass) summary; chunk summaries use `map_llm` when given.
+    sections, if known, are passed to chunk_text.
+    """
+    
+    log_info(f"Starting document processing: ~{estimate_tokens(text)} tokens, budget {token_budget} per call")
     
     # Single chunk processing
-    if len(text) <= 15000:
+    if len(text) <= max_chunk_chars(token_budget):
         log_info("Processing as single chunk")
         
         if status_text:
@@ -119,7 +536,7 @@ def process_document(text, llm, chunk_size=4000, chunk_overlap=500,
         if progress_bar:
             progress_bar.progress(75)
         
-        summary = summarize_text_chunk(llm, text)
+        summary = summarize_text_chunk(llm, text, on_token=on_token)
         
         if progress_bar:
             progress_bar.progress(100)
@@ -129,27 +546,61 @@ def process_document(text, llm, chunk_size=4000, chunk_overlap=500,
     
     # Multi-chunk processing
     log_info("Processing as multiple chunks")
-    chunks = chunk_text(text, chunk_size, chunk_overlap)
-    chunk_summaries = []
+    chunk_size = plan_chunk_size(len(text), token_budget, chunk_overlap)
+    chunks = chunk_text(text, chunk_size, chunk_overlap, sections=sections)
     
-    # Process each chunk
-    for i, chunk in enumerate(chunks):
-        log_info(f"Processing chunk {i+1}/{len(chunks)}")
-        
-        if status_text:
-            status_text.text(f"Processing section {i+1} of {len(chunks)}...")
-        
-        summary = summarize_text_chunk(llm, chunk, i+1)
-        if summary:
-            chunk_summaries.append(summary)
-            log_info(f"Chunk {i+1} processed successfully")
+    if status_text:
+        status_text.text(f"Processing {len(chunks)} sections...")
+    
+    return map_reduce_chunks(llm, chunks, progress_bar, status_text, max_concurrency, on_token, map_llm)
+
+def process_document_stream(blocks, llm, token_budget=CALL_TOKEN_BUDGET, chunk_overlap=500,
+                            progress_bar=None, status_text=None,
+                            max_concurrency=MAX_CONCURRENT_CHUNKS, on_token=None, map_llm=None):
+    """Summarize a stream of text blocks, starting chunk summaries while extraction continues"""
+    log_info("Starting streamed document processing")
+    blocks = iter(blocks)
+    chunk_size = max_chunk_chars(token_budget)
+    
+    try:
+        # Buffer until the document is known to need more than one pass
+        head = []
+        head_length = 0
+        for block in blocks:
+            head.append(block)
+            head_length += len(block)
+            if head_length > chunk_size:
+                break
         else:
-            log_warning(f"Failed to process chunk {i+1}")
+            text = "".join(head)
+            if not text.strip():
+                log_error("No text extracted from document stream")
+                return None
+            return process_document(text, llm, token_budget, chunk_overlap,
+                                    progress_bar, status_text, max_concurrency, on_token, map_llm)
         
+        # Total length is unknown while streaming, so chunks are packed to the full budget
+        log_info("Processing stream as multiple chunks")
+        if status_text:
+            status_text.text("Processing sections as they are extracted...")
+        chunks = iter_text_chunks(chain(head, blocks), chunk_size, chunk_overlap)
+        return map_reduce_chunks(llm, chunks, progress_bar, status_text, max_concurrency, on_token, map_llm)
+    except Exception as e:
+        log_error(f"Streamed document processing failed: {str(e)}")
+        return None
+
+def map_reduce_chunks(llm, chunks, progress_bar=None, status_text=None,
+                      max_concurrency=MAX_CONCURRENT_CHUNKS, on_token=None, map_llm=None):
+    """Summarize chunks concurrently (with map_llm if given), then reduce them with llm"""
+    def on_chunk_done(completed, total):
+        if status_text:
+            status_text.text(f"Processed {completed} of {total} sections...")
         if progress_bar:
-            progress_bar.progress(25 + (i + 1) * 50 // len(chunks))
-        
-        time.sleep(1)  # Rate limiting
+            progress_bar.progress(25 + completed * 50 // total)
+    
+    # Map phase: summaries come back in chunk order regardless of completion order
+    results = summarize_chunks(map_llm or llm, chunks, max_concurrency, on_chunk_done)
+    chunk_summaries = [summary for summary in results if summary]
     
     # Create final summary
     if chunk_summaries:
@@ -160,7 +611,8 @@ def process_document(text, llm, chunk_size=4000, chunk_overlap=500,
         if progress_bar:
             progress_bar.progress(90)
         
-        final_summary = create_final_summary(llm, chunk_summaries)
+        final_summary = reduce_summaries(llm, chunk_summaries, max_concurrency=max_concurrency,
+                                         on_token=on_token)
         
         if progress_bar:
             progress_bar.progress(100)
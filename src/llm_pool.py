@@ -0,0 +1,110 @@
+import atexit
+import os
+import threading
+import time
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.messages import HumanMessage
+from utils.logger import log_info, log_error, log_warning
+
+# Maximum distinct model configurations kept alive in this process
+LLM_POOL_MAX_CLIENTS = int(os.getenv("LLM_POOL_MAX_CLIENTS", "4"))
+
+_clients = {}
+_pool_lock = threading.Lock()
+
+
+def _pool_key(model, temperature, max_retries, **kwargs):
+    """Build a hashable key from a model configuration"""
+    return (model, temperature, max_retries) + tuple(sorted(kwargs.items()))
+
+
+def get_chat_llm(model, temperature, max_retries=3, **kwargs):
+    """Get a shared ChatGoogleGenerativeAI for this configuration, creating it on first use"""
+    key = _pool_key(model, temperature, max_retries, **kwargs)
+    
+    with _pool_lock:
+        entry = _clients.pop(key, None)
+        if entry is None:
+            log_info(f"Creating pooled ChatGoogleGenerativeAI client for {model} (temperature {temperature})")
+            entry = {
+                'llm': ChatGoogleGenerativeAI(
+                    model=model,
+                    temperature=temperature,
+                    max_retries=max_retries,
+                    **kwargs
+                ),
+                'created': time.time(),
+                'uses': 0
+            }
+        
+        # Re-insert so the dict stays ordered from least to most recently used
+        entry['uses'] += 1
+        _clients[key] = entry
+        _evict_excess_clients()
+        return entry['llm']
+
+
+def _evict_excess_clients():
+    """Drop least recently used clients beyond the pool limit (caller holds the lock)
+    
+    Evicted clients are not closed: another thread may still be mid-call on one, and its
+    transport is released once the last reference to it goes away.
+    """
+    while len(_clients) > LLM_POOL_MAX_CLIENTS:
+        key = next(iter(_clients))
+        del _clients[key]
+        log_info(f"Evicted pooled LLM client for {key[0]}")
+
+
+def _close_client(llm):
+    """Close the underlying transport of a client where the SDK exposes one"""
+    for attr in ('client', 'async_client'):
+        transport = getattr(llm, attr, None)
+        close = getattr(transport, 'close', None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                log_warning(f"Error closing LLM client transport: {str(e)}")
+
+
+def check_pool_health(ping=False):
+    """Report pooled clients; with ping=True also send a minimal request through each"""
+    with _pool_lock:
+        entries = list(_clients.items())
+    
+    report = []
+    for key, entry in entries:
+        status = {
+            'model': key[0],
+            'temperature': key[1],
+            'uses': entry['uses'],
+            'age_seconds': round(time.time() - entry['created'], 1),
+            'healthy': True
+        }
+        if ping:
+            try:
+                entry['llm'].invoke([HumanMessage(content="ping")])
+            except Exception as e:
+                status['healthy'] = False
+                status['error'] = str(e)
+                log_error(f"Pooled LLM client for {key[0]} failed health check: {str(e)}")
+                # Dropped, not closed, for the same reason as in _evict_excess_clients
+                with _pool_lock:
+                    if _clients.get(key) is entry:
+                        del _clients[key]
+        report.append(status)
+    return report
+
+
+def shutdown_llm_pool():
+    """Close every pooled client; registered to run at interpreter exit"""
+    with _pool_lock:
+        for entry in _clients.values():
+            _close_client(entry['llm'])
+        if _clients:
+            log_info(f"Closed {len(_clients)} pooled LLM clients")
+        _clients.clear()
+
+
+atexit.register(shutdown_llm_pool)
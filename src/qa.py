@@ -0,0 +1,275 @@
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from itertools import islice
+import faiss
+import numpy as np
+from src.extractive import WORD_PATTERN, STOPWORDS
+from src.llm_handler import chunk_text, iter_text_chunks, invoke_with_rate_limit, build_question_messages
+from utils.logger import log_info, log_error
+from utils.metrics import stage_timer
+
+# Persisted indexes, one set of files per document hash, embedder and chunk size
+INDEX_DIR = os.getenv("QA_INDEX_DIR", os.path.join("cache", "indexes"))
+
+# Bumped when the on-disk index layout changes so stale indexes are rebuilt
+INDEX_VERSION = "1"
+
+# Retrieval chunks are much smaller than summarization chunks so answers stay targeted
+QA_CHUNK_CHARS = int(os.getenv("QA_CHUNK_CHARS", "1500"))
+QA_CHUNK_OVERLAP = 200
+QA_TOP_K = int(os.getenv("QA_TOP_K", "4"))
+
+QA_EMBEDDER = os.getenv("QA_EMBEDDER", "hashing")
+EMBEDDING_DIM = int(os.getenv("QA_EMBEDDING_DIM", "4096"))
+GEMINI_EMBEDDING_MODEL = os.getenv("QA_GEMINI_EMBEDDING_MODEL", "models/text-embedding-004")
+EMBED_BATCH_SIZE = 64
+
+# Indexes kept loaded in this process
+LOADED_INDEX_LIMIT = 4
+
+_loaded = OrderedDict()
+_loaded_lock = threading.Lock()
+_build_locks = {}
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def _batches(items, size=EMBED_BATCH_SIZE):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+class HashingEmbedder:
+    """Offline TF-IDF embedder over hashed word unigrams and bigrams
+
+    Terms are hashed with CRC-32 so vectors are stable across processes. IDF weights come
+    from fit() over the document's chunks and are saved with the index.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing{dim}"
+        self.idf = np.ones(dim, dtype=np.float32)
+
+    def _term_counts(self, texts):
+        """Sublinear term frequencies, signed-hashed into dim columns"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = [token for token in WORD_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+            terms = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+            if not terms:
+                continue
+            unique, counts = np.unique(np.array(terms), return_counts=True)
+            hashes = np.fromiter((zlib.crc32(term.encode("utf-8")) for term in unique),
+                                 dtype=np.int64, count=len(unique))
+            # A hash-derived sign keeps colliding terms from only ever adding up
+            signs = np.where((hashes // self.dim) % 2 == 0, 1.0, -1.0)
+            np.add.at(matrix[i], hashes % self.dim, signs * np.log1p(counts))
+        return matrix
+
+    def fit(self, texts):
+        """Learn IDF weights from an iterable of texts"""
+        document_frequency = np.zeros(self.dim, dtype=np.float64)
+        count = 0
+        for batch in _batches(texts):
+            document_frequency += np.count_nonzero(self._term_counts(batch), axis=0)
+            count += len(batch)
+        self.idf = (np.log((1 + count) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self
+
+    def embed(self, texts):
+        return _normalize(self._term_counts(texts) * self.idf)
+
+    def get_state(self):
+        return {"idf": self.idf}
+
+    def set_state(self, state):
+        self.idf = state["idf"]
+
+
+class GeminiEmbedder:
+    """Gemini embedding API; needs GOOGLE_API_KEY and sends chunk text to Google"""
+
+    def __init__(self, model=GEMINI_EMBEDDING_MODEL):
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        self.client = GoogleGenerativeAIEmbeddings(model=model)
+        self.name = "gemini-" + model.rsplit("/", 1)[-1]
+
+    def embed(self, texts):
+        return _normalize(np.array(self.client.embed_documents(list(texts)), dtype=np.float32))
+
+
+# Embedders selectable with QA_EMBEDDER; any object with name and embed(texts) can be passed directly
+EMBEDDERS = {
+    "hashing": HashingEmbedder,
+    "gemini": GeminiEmbedder,
+}
+
+
+def get_embedder(name=None):
+    """Create the configured embedder"""
+    return EMBEDDERS[name or QA_EMBEDDER]()
+
+
+class DocumentIndex:
+    """FAISS index over a document's chunks; chunk text stays on disk and is read back by offset"""
+
+    def __init__(self, index, chunks_path, offsets, embedder):
+        self.index = index
+        self.chunks_path = chunks_path
+        self.offsets = offsets
+        self.embedder = embedder
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def read_chunk(self, chunk_id):
+        with open(self.chunks_path, 'r', encoding='utf-8') as f:
+            f.seek(int(self.offsets[chunk_id]))
+            return json.loads(f.readline())
+
+    def search(self, question, top_k=QA_TOP_K):
+        """Get (score, chunk_id, text) for the chunks most similar to the question"""
+        if not len(self):
+            return []
+        scores, ids = self.index.search(self.embedder.embed([question]), min(top_k, len(self)))
+        return [(float(score), int(chunk_id), self.read_chunk(chunk_id))
+                for score, chunk_id in zip(scores[0], ids[0]) if chunk_id >= 0]
+
+
+def _index_base_path(file_hash, embedder):
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    return os.path.join(INDEX_DIR, f"{file_hash}-{embedder.name}-{QA_CHUNK_CHARS}-v{INDEX_VERSION}")
+
+
+def _iter_chunks(text):
+    """Retrieval chunks from in-memory text or text spooled to disk"""
+    if isinstance(text, str):
+        return iter(chunk_text(text, QA_CHUNK_CHARS, QA_CHUNK_OVERLAP))
+    return iter_text_chunks(text.iter_blocks(), QA_CHUNK_CHARS, QA_CHUNK_OVERLAP)
+
+
+def _iter_stored_chunks(chunks_path):
+    with open(chunks_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def build_document_index(text, file_hash, embedder=None):
+    """Chunk, embed and index a document, persisting the index next to its chunks"""
+    embedder = embedder or get_embedder()
+    base_path = _index_base_path(file_hash, embedder)
+    log_info(f"Building {embedder.name} index for document {file_hash[:12]}")
+
+    with stage_timer("indexing", input_chars=len(text)) as span:
+        # Chunks go to disk first so large documents never hold every chunk in memory
+        chunks_path = f"{base_path}.chunks.jsonl"
+        offsets = []
+        temp_path = f"{chunks_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for chunk in _iter_chunks(text):
+                offsets.append(f.tell())
+                span.output_chars += len(chunk)
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        os.replace(temp_path, chunks_path)
+        offsets = np.array(offsets, dtype=np.int64)
+
+        if hasattr(embedder, "fit"):
+            embedder.fit(_iter_stored_chunks(chunks_path))
+
+        index = None
+        for batch in _batches(_iter_stored_chunks(chunks_path)):
+            vectors = embedder.embed(batch)
+            if index is None:
+                # Half-precision storage halves memory with no training step
+                index = faiss.IndexScalarQuantizer(vectors.shape[1], faiss.ScalarQuantizer.QT_fp16,
+                                                   faiss.METRIC_INNER_PRODUCT)
+            index.add(vectors)
+        if index is None:
+            index = faiss.IndexFlatIP(getattr(embedder, "dim", 1))
+
+        state = embedder.get_state() if hasattr(embedder, "get_state") else {}
+        np.savez(f"{base_path}.npz", offsets=offsets, **state)
+        # The .faiss file is written last and marks the index as complete
+        faiss.write_index(index, f"{base_path}.faiss.{os.getpid()}.tmp")
+        os.replace(f"{base_path}.faiss.{os.getpid()}.tmp", f"{base_path}.faiss")
+
+    log_info(f"Indexed {len(offsets)} chunks for document {file_hash[:12]}")
+    return DocumentIndex(index, chunks_path, offsets, embedder)
+
+
+def load_document_index(file_hash, embedder=None):
+    """Load a persisted index for a document, or None if there is none"""
+    embedder = embedder or get_embedder()
+    base_path = _index_base_path(file_hash, embedder)
+    if not os.path.exists(f"{base_path}.faiss"):
+        return None
+
+    try:
+        with np.load(f"{base_path}.npz") as arrays:
+            state = {key: arrays[key] for key in arrays.files}
+        offsets = state.pop("offsets")
+        if hasattr(embedder, "set_state"):
+            embedder.set_state(state)
+        index = faiss.read_index(f"{base_path}.faiss")
+        log_info(f"Loaded {embedder.name} index for document {file_hash[:12]} ({len(offsets)} chunks)")
+        return DocumentIndex(index, f"{base_path}.chunks.jsonl", offsets, embedder)
+    except Exception as e:
+        log_error(f"Failed to load index for document {file_hash[:12]}: {str(e)}")
+        return None
+
+
+def get_document_index(text, file_hash, embedder=None):
+    """Get a document's index from memory or disk, building it on first use
+    
+    Embedders with fit() are stateful, so pass a fresh instance per document.
+    """
+    embedder = embedder or get_embedder()
+    key = (file_hash, embedder.name)
+
+    with _loaded_lock:
+        if key in _loaded:
+            _loaded.move_to_end(key)
+            return _loaded[key]
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+
+    # Sessions asking about the same document wait for one build instead of repeating it
+    with build_lock:
+        with _loaded_lock:
+            if key in _loaded:
+                return _loaded[key]
+        document_index = load_document_index(file_hash, embedder) or build_document_index(text, file_hash, embedder)
+
+        with _loaded_lock:
+            _loaded[key] = document_index
+            while len(_loaded) > LOADED_INDEX_LIMIT:
+                _loaded.popitem(last=False)
+            _build_locks.pop(key, None)
+    return document_index
+
+
+def answer_question(llm, question, document_index, top_k=QA_TOP_K, on_token=None):
+    """Answer a question from the top-k retrieved chunks in one LLM call, returning (answer, hits)"""
+    hits = document_index.search(question, top_k)
+    if not hits:
+        return None, hits
+
+    excerpts = [chunk for _, _, chunk in hits]
+    log_info(f"Answering question from {len(hits)} of {len(document_index)} chunks")
+
+    with stage_timer("qa", input_chars=sum(len(excerpt) for excerpt in excerpts)) as span:
+        try:
+            response = invoke_with_rate_limit(llm, build_question_messages(question, excerpts), on_token)
+            span.output_chars = len(response.content)
+            return response.content, hits
+        except Exception as e:
+            log_error(f"Error answering question: {str(e)}")
+            span.error = True
+            return None, hits
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from utils.logger import log_info, log_warning
+
+# Default quotas, override via environment to match the API project's limits
+DEFAULT_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+DEFAULT_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+
+# Successful calls needed before the concurrency limit grows by one
+ADDITIVE_INCREASE_INTERVAL = 5
+
+# Seconds between retries when an async caller is waiting for a concurrency slot
+ASYNC_POLL_INTERVAL = 0.05
+
+RATE_LIMIT_MARKERS = ("429", "quota", "resource_exhausted", "resourceexhausted", "rate limit")
+
+
+def is_rate_limit_error(error):
+    """Check whether an exception signals a quota or 429 response"""
+    message = f"{type(error).__name__} {error}".lower()
+    return any(marker in message for marker in RATE_LIMIT_MARKERS)
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at capacity-per-minute"""
+
+    def __init__(self, capacity_per_minute):
+        self.capacity = float(capacity_per_minute)
+        self.tokens = float(capacity_per_minute)
+        self.refill_rate = capacity_per_minute / 60.0
+        self.last_refill = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+        self.last_refill = now
+
+    def wait_time(self, amount):
+        """Seconds until amount can be taken (0 if available now)"""
+        self._refill()
+        # Requests larger than the bucket are allowed once it is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_rate
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Requests/tokens-per-minute limiter with AIMD concurrency control"""
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency_limit = self.max_concurrency
+        self.in_flight = 0
+        self.success_streak = 0
+        self._condition = threading.Condition()
+
+    def _try_acquire_locked(self, tokens):
+        """Take a slot and quota if available; return 0, or seconds to wait (None = until a release)"""
+        if self.in_flight >= self.concurrency_limit:
+            return None
+        wait = max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(tokens))
+        if wait == 0:
+            self.request_bucket.take(1)
+            self.token_bucket.take(tokens)
+            self.in_flight += 1
+        return wait
+
+    def acquire(self, tokens):
+        """Block until a concurrency slot and quota for one request of `tokens` are free"""
+        with self._condition:
+            while True:
+                wait = self._try_acquire_locked(tokens)
+                if wait == 0:
+                    return
+                self._condition.wait(timeout=wait)
+
+    def try_acquire(self, tokens):
+        """Non-blocking acquire for event loops; returns 0 on success, else seconds to wait before retrying"""
+        with self._condition:
+            wait = self._try_acquire_locked(tokens)
+        # Without a release notification to wait on, poll at a short interval
+        return ASYNC_POLL_INTERVAL if wait is None else wait
+
+    def release(self, throttled=False):
+        """Release a slot, adjusting the concurrency limit from the call outcome"""
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                # Multiplicative decrease and drain the request bucket so callers pause
+                self.concurrency_limit = max(1, self.concurrency_limit // 2)
+                self.success_streak = 0
+                self.request_bucket.tokens = 0
+                log_warning(f"Rate limit hit, concurrency limit reduced to {self.concurrency_limit}")
+            else:
+                self.success_streak += 1
+                if (self.concurrency_limit < self.max_concurrency
+                        and self.success_streak >= ADDITIVE_INCREASE_INTERVAL):
+                    self.concurrency_limit += 1
+                    self.success_streak = 0
+                    log_info(f"Concurrency limit increased to {self.concurrency_limit}")
+            self._condition.notify_all()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Get the process-wide rate limiter shared by all sessions"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+            log_info(f"Rate limiter initialized: {DEFAULT_REQUESTS_PER_MINUTE} RPM, "
+                     f"{DEFAULT_TOKENS_PER_MINUTE} TPM, max concurrency {DEFAULT_MAX_CONCURRENCY}")
+        return _limiter
+
+
+def configure_rate_limiter(requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                           tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                           max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """Replace the process-wide rate limiter, e.g. to set a global cap for batch runs"""
+    global _limiter
+    with _limiter_lock:
+        _limiter = RateLimiter(requests_per_minute, tokens_per_minute, max_concurrency)
+        log_info(f"Rate limiter configured: {requests_per_minute} RPM, "
+                 f"{tokens_per_minute} TPM, max concurrency {max_concurrency}")
+        return _limiter
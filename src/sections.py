@@ -0,0 +1,201 @@
+import re
+from collections import deque
+from utils.logger import log_info
+
+# Canonical section names and the heading texts that introduce them
+SECTION_HEADINGS = {
+    'abstract': ('abstract', 'summary'),
+    'introduction': ('introduction', 'overview'),
+    'background': ('background', 'related work', 'literature review', 'prior work'),
+    'methods': ('methods', 'method', 'methodology', 'materials and methods', 'approach',
+                'experimental setup', 'proposed method'),
+    'results': ('results', 'experiments', 'evaluation', 'findings', 'experimental results'),
+    'discussion': ('discussion', 'analysis', 'limitations'),
+    'conclusion': ('conclusion', 'conclusions', 'concluding remarks', 'future work'),
+    'acknowledgements': ('acknowledgements', 'acknowledgments', 'acknowledgement', 'acknowledgment'),
+    'references': ('references', 'bibliography', 'works cited', 'literature cited'),
+    'appendix': ('appendix', 'appendices', 'supplementary material', 'supplementary materials')
+}
+
+# Sections dropped before summarization unless the caller chooses otherwise
+DEFAULT_EXCLUDED_SECTIONS = ('references',)
+
+# Text before the first recognized heading (title, authors)
+FRONT_MATTER = 'front'
+
+# Longest line considered as a possible heading
+MAX_HEADING_LINE = 40
+
+# Excluded sections are only dropped when they start past this fraction of the text,
+# so a stray heading-like line early on cannot remove the body of the paper
+MIN_EXCLUDED_SECTION_POSITION = 0.5
+
+# A capitalized heading line, optionally numbered ("2.", "3.1", "IV.", "A")
+HEADING_LINE_PATTERN = re.compile(
+    r"[ \t]*(?:(?:\d+(?:\.\d+)*|[IVX]+|[A-H])[.)]?[ \t]+)?([A-Z][A-Za-z &\-]{2,35}?)[ \t]*:?[ \t\r]*"
+)
+
+# Cheap scan for short lines that start like a heading, so body text never reaches
+# the full heading pattern
+CANDIDATE_LINE_PATTERN = re.compile(r"\n([ \t]*[A-Z0-9][^\n]{2,%d})(?=\n|\Z)" % (MAX_HEADING_LINE - 1))
+
+_HEADING_LOOKUP = {heading: name for name, headings in SECTION_HEADINGS.items() for heading in headings}
+
+
+def classify_heading(title):
+    """Map a heading line's text to a canonical section name, or None"""
+    normalized = " ".join(title.lower().split())
+    if normalized in _HEADING_LOOKUP:
+        return _HEADING_LOOKUP[normalized]
+    # "Appendix A", "Appendix B Proofs"
+    if normalized.startswith(('appendix ', 'supplementary ')):
+        return 'appendix'
+    return None
+
+
+def iter_headings(text):
+    """Yield (start, canonical name) for each line that is a recognized section heading"""
+    # The first line has no preceding newline for the candidate scan to anchor on
+    first_line_end = text.find("\n")
+    candidates = [(0, first_line_end if first_line_end != -1 else len(text))]
+    candidates.extend(match.span(1) for match in CANDIDATE_LINE_PATTERN.finditer(text))
+    
+    for start, end in candidates:
+        if end - start > MAX_HEADING_LINE:
+            continue
+        match = HEADING_LINE_PATTERN.fullmatch(text, start, end)
+        name = classify_heading(match.group(1)) if match else None
+        if name:
+            yield start, name
+
+def detect_sections(text):
+    """Find recognized section headings, returning (name, start, end) spans covering the text"""
+    sections = []
+    current_name, current_start = FRONT_MATTER, 0
+    
+    for heading_start, name in iter_headings(text):
+        if heading_start > current_start:
+            sections.append((current_name, current_start, heading_start))
+        current_name, current_start = name, heading_start
+    
+    if current_start < len(text):
+        sections.append((current_name, current_start, len(text)))
+    return sections
+
+
+def filter_sections(text, excluded=DEFAULT_EXCLUDED_SECTIONS):
+    """Drop excluded sections (e.g. references) from text before summarization"""
+    if not excluded:
+        return text
+    return split_sections(text, excluded)[0]
+
+
+def split_sections(text, excluded=DEFAULT_EXCLUDED_SECTIONS):
+    """filter_sections that also returns the sections of the filtered text
+    
+    The (name, start, end) spans are offsets into the returned text, so the chunker can
+    align to them without detecting sections a second time.
+    """
+    sections = detect_sections(text)
+    min_start = len(text) * MIN_EXCLUDED_SECTION_POSITION
+    dropped = [(name, start, end) for name, start, end in sections
+               if name in excluded and start >= min_start]
+    if not dropped:
+        return text, sections
+    
+    for name, start, end in dropped:
+        log_info(f"Skipping {name} section: {end - start} characters")
+    kept = [(name, start, end) for name, start, end in sections if (name, start, end) not in dropped]
+    filtered_sections = []
+    offset = 0
+    for name, start, end in kept:
+        filtered_sections.append((name, offset, offset + end - start))
+        offset += end - start
+    return "".join(text[start:end] for _, start, end in kept), filtered_sections
+
+
+def iter_filtered_sections(blocks, excluded=DEFAULT_EXCLUDED_SECTIONS):
+    """Streaming filter_sections: yield text blocks with excluded sections dropped
+    
+    Text is scanned in whole lines so headings are found exactly as in the full text. An
+    excluded section is held back until the text seen so far proves it starts before
+    MIN_EXCLUDED_SECTION_POSITION of the whole (so it is kept), or the stream ends.
+    """
+    if not excluded:
+        yield from blocks
+        return
+    
+    held = deque()  # (section name, section start, text) from the first undecided excluded section on
+    section = (FRONT_MATTER, 0)
+    offset = 0
+    pending = ""
+    at_line_start = True
+    
+    def split(segment, headings_from):
+        """Yield (section, text) pieces of a segment starting at offset, switching at headings"""
+        nonlocal section
+        if headings_from is None:
+            headings = []
+        elif offset == 0:
+            headings = list(iter_headings(segment))
+        else:
+            # A leading newline makes the first line a candidate exactly as in the full text
+            headings = [(start - 1, name) for start, name in iter_headings("\n" + segment[headings_from:])]
+            headings = [(start + headings_from, name) for start, name in headings]
+        position = 0
+        for start, name in headings:
+            if start > position:
+                yield section, segment[position:start]
+                position = start
+            section = (name, offset + start)
+        if position < len(segment):
+            yield section, segment[position:]
+    
+    def release(total, final):
+        """Yield held pieces whose section is decided, in order"""
+        dropped = {}
+        while held:
+            name, start, text = held[0]
+            if name in excluded and start >= total * MIN_EXCLUDED_SECTION_POSITION:
+                if not final:
+                    break
+                dropped[(name, start)] = dropped.get((name, start), 0) + len(text)
+            else:
+                yield text
+            held.popleft()
+        for (name, _), size in dropped.items():
+            log_info(f"Skipping {name} section: {size} characters")
+    
+    def scan(segment, line_start):
+        nonlocal offset
+        if line_start:
+            headings_from = 0
+        else:
+            # The segment continues a line begun earlier; headings can only follow its end
+            newline = segment.find("\n")
+            headings_from = None if newline == -1 else newline + 1
+        for (name, start), text in split(segment, headings_from):
+            if held or name in excluded:
+                held.append((name, start, text))
+            else:
+                yield text
+        offset += len(segment)
+        yield from release(offset, final=False)
+    
+    for block in blocks:
+        pending += block
+        cut = pending.rfind("\n")
+        if cut == -1:
+            # A line longer than any heading can be passed on before it ends
+            if len(pending) > MAX_HEADING_LINE:
+                yield from scan(pending, at_line_start)
+                pending = ""
+                at_line_start = False
+            continue
+        yield from scan(pending[:cut + 1], at_line_start)
+        pending = pending[cut + 1:]
+        at_line_start = True
+    
+    if pending:
+        yield from scan(pending, at_line_start)
+    yield from release(offset, final=True)
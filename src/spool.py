@@ -0,0 +1,180 @@
+import mmap
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from utils.logger import log_info, log_warning
+
+MB = 1024 * 1024
+
+# Temp directory for spooled uploads and extracted text
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join(tempfile.gettempdir(), "document_summarizer_spool"))
+
+# Uploads at least this large are copied to disk and parsed through mmap
+SPOOL_THRESHOLD_BYTES = int(os.getenv("SPOOL_THRESHOLD_MB", "20")) * MB
+
+# Extracted text a session may hold in memory; larger documents are streamed from disk
+SESSION_MEMORY_BUDGET_BYTES = int(os.getenv("SESSION_MEMORY_BUDGET_MB", "256")) * MB
+
+# Spool files untouched for this long are removed when new files are spooled
+SPOOL_RETENTION_SECONDS = 6 * 3600
+
+# Bytes copied per write when spooling, and characters per block when streaming text back
+SPOOL_BLOCK_BYTES = MB
+TEXT_BLOCK_CHARS = 256 * 1024
+
+
+class MappedFile:
+    """Read-only memory-mapped file with the name/size attributes the extractors expect from uploads"""
+
+    def __init__(self, path, name=None):
+        self.path = path
+        self.name = name or os.path.basename(path)
+        self.size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            # The mapping stays valid after the descriptor is closed
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, size=-1):
+        return self._map.read(size)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._map.seek(offset, whence)
+        return self._map.tell()
+
+    def tell(self):
+        return self._map.tell()
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MemoryBudget:
+    """A session's text memory budget, shared with the background jobs it submits
+
+    `foreground` is the text the session holds itself and is updated from the script
+    thread; jobs reserve what they hold on top of it.
+    """
+
+    def __init__(self, limit=SESSION_MEMORY_BUDGET_BYTES):
+        self.limit = limit
+        self.foreground = 0
+        self.reserved = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size):
+        """Claim size bytes for a job, returning False if they do not fit"""
+        with self._lock:
+            if self.foreground + self.reserved + size > self.limit:
+                return False
+            self.reserved += size
+            return True
+
+    def release(self, size):
+        with self._lock:
+            self.reserved -= size
+
+
+class SpooledText:
+    """Extracted text kept on disk; len() is its length in characters"""
+
+    def __init__(self, path, chars):
+        self.path = path
+        self.chars = chars
+
+    def __len__(self):
+        return self.chars
+
+    @property
+    def disk_bytes(self):
+        return os.path.getsize(self.path)
+
+    def iter_blocks(self, block_chars=TEXT_BLOCK_CHARS):
+        """Yield the text in blocks of at most block_chars characters"""
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            while True:
+                block = f.read(block_chars)
+                if not block:
+                    return
+                yield block
+
+    def read(self):
+        """Load the whole text into memory"""
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            return f.read()
+
+
+def _spool_path(key, suffix):
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    return os.path.join(SPOOL_DIR, f"{key}{suffix}")
+
+
+def prune_spool_dir(retention_seconds=SPOOL_RETENTION_SECONDS):
+    """Remove spooled files that have not been touched within the retention period"""
+    if not os.path.isdir(SPOOL_DIR):
+        return
+    cutoff = time.time() - retention_seconds
+    for entry in os.scandir(SPOOL_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError as e:
+            log_warning(f"Could not remove spool file {entry.name}: {str(e)}")
+
+
+def spool_temp_copy(uploaded_file):
+    """Copy an upload to a uniquely named spool file owned by the caller, who removes it"""
+    prune_spool_dir()
+    extension = uploaded_file.name.lower().rsplit('.', 1)[-1]
+    path = _spool_path(uuid.uuid4().hex, f".copy.{extension}")
+    _write_file(uploaded_file, path)
+    return path
+
+
+def _write_file(uploaded_file, path):
+    """Write an upload's contents to path"""
+    with open(path, 'wb') as f:
+        if hasattr(uploaded_file, 'getbuffer'):
+            # Write straight from the upload buffer instead of copying it into new bytes
+            with uploaded_file.getbuffer() as view:
+                for offset in range(0, len(view), SPOOL_BLOCK_BYTES):
+                    f.write(view[offset:offset + SPOOL_BLOCK_BYTES])
+        else:
+            uploaded_file.seek(0)
+            while block := uploaded_file.read(SPOOL_BLOCK_BYTES):
+                f.write(block)
+            uploaded_file.seek(0)
+
+
+def spool_text(blocks, text_key):
+    """Write a stream of text blocks to a spool file named by text_key, returning a SpooledText"""
+    path = _spool_path(text_key, ".text")
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    chars = 0
+    with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+        for block in blocks:
+            f.write(block)
+            chars += len(block)
+    os.replace(temp_path, path)
+    return SpooledText(path, chars)
+
+
+def text_memory_bytes(text):
+    """Approximate memory held by extracted text (0 when it lives on disk)"""
+    if isinstance(text, str):
+        return sys.getsizeof(text)
+    return 0
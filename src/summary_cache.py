@@ -0,0 +1,103 @@
+import hashlib
+import os
+import sqlite3
+import time
+from utils.logger import log_info, log_error, log_warning
+
+CACHE_DIR = os.getenv("SUMMARY_CACHE_DIR", "cache")
+CACHE_DB_PATH = os.path.join(CACHE_DIR, "summaries.db")
+CACHE_MAX_BYTES = int(os.getenv("SUMMARY_CACHE_MAX_MB", "200")) * 1024 * 1024
+
+# Seconds to wait on a lock held by another worker process
+CACHE_LOCK_TIMEOUT = 10
+
+
+def make_cache_key(text, model, temperature, prompt_version, token_budget, chunk_overlap):
+    """Build a content-addressed key for a summary; `text` may also be an iterable of text blocks"""
+    hasher = hashlib.sha256()
+    for block in ([text] if isinstance(text, str) else text):
+        hasher.update(block.encode("utf-8"))
+    hasher.update(f"|{model}|{temperature}|{prompt_version}|{token_budget}|{chunk_overlap}".encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def make_chunk_cache_key(chunk, model, temperature, prompt_version):
+    """Build a content-addressed key for a single chunk summary"""
+    hasher = hashlib.sha256()
+    hasher.update(b"chunk|")
+    hasher.update(chunk.encode("utf-8"))
+    hasher.update(f"|{model}|{temperature}|{prompt_version}".encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def _connect(db_path=CACHE_DB_PATH):
+    """Open the cache database, creating it if needed"""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=CACHE_LOCK_TIMEOUT)
+    # WAL lets readers in other processes proceed while one process writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS summaries (
+            key TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_last_access ON summaries(last_access)")
+    return conn
+
+
+def get_cached_summary(key, db_path=CACHE_DB_PATH):
+    """Return the cached summary for key, or None on a miss"""
+    try:
+        conn = _connect(db_path)
+        try:
+            with conn:
+                row = conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    log_info(f"Summary cache miss: {key[:12]}")
+                    return None
+                conn.execute("UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key))
+            log_info(f"Summary cache hit: {key[:12]}")
+            return row[0]
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        log_warning(f"Summary cache read failed: {str(e)}")
+        return None
+
+
+def store_summary(key, summary, db_path=CACHE_DB_PATH, max_bytes=CACHE_MAX_BYTES):
+    """Store a summary and evict least recently used entries over the size limit"""
+    size = len(summary.encode("utf-8"))
+    try:
+        conn = _connect(db_path)
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO summaries (key, summary, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, summary, size, time.time())
+                )
+                _evict(conn, max_bytes)
+            log_info(f"Summary cached: {key[:12]} ({size} bytes)")
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        log_error(f"Summary cache write failed: {str(e)}")
+
+
+def _evict(conn, max_bytes):
+    """Delete least recently used entries until the cache fits in max_bytes"""
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+    if total <= max_bytes:
+        return
+    
+    evicted = 0
+    for key, size in conn.execute("SELECT key, size FROM summaries ORDER BY last_access ASC").fetchall():
+        if total <= max_bytes:
+            break
+        conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+        total -= size
+        evicted += 1
+    log_info(f"Summary cache evicted {evicted} entries")
@@ -1,8 +1,42 @@
 import streamlit as st
 import os
-from utils.logger import log_info, log_error
-from src.document_processor import get_document_info, extract_text_from_document
-from src.llm_handler import initialize_chat_llm, process_document, chunk_text
+import time
+import zipfile
+from io import BytesIO
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from utils.logger import log_info, log_error, set_log_context
+from utils.metrics import stage_timer, get_stage_summary
+from src.document_processor import (get_cached_document_info, get_cached_document_text,
+                                    get_file_hash, get_session_memory_budget, get_session_memory_usage)
+from src.job_queue import (make_job_key, get_summary_job, submit_summary_job, submit_document_job,
+                           make_document_cache_key, prepare_llm_text, JOB_FAILED)
+from src.rate_limiter import get_rate_limiter
+from src.llm_handler import CALL_TOKEN_BUDGET, initialize_chat_llm
+from src.qa import get_document_index, answer_question
+from src.extractive import extractive_summary
+from src.sections import DEFAULT_EXCLUDED_SECTIONS
+from src.summary_cache import get_cached_summary
+from src.spool import MB
+
+# Choices offered for the per-call token budget
+TOKEN_BUDGET_OPTIONS = [8000, 16000, 32000, 64000, 100000, 200000]
+
+MODE_AI = "AI summary"
+MODE_INSTANT = "Instant extractive (no AI)"
+
+DEFAULT_SETTINGS = {
+    'token_budget': CALL_TOKEN_BUDGET,
+    'chunk_overlap': 500,
+    'summary_mode': MODE_AI,
+    'compression_ratio': 1.0,
+    'excluded_sections': DEFAULT_EXCLUDED_SECTIONS
+}
+
+# Sections the user may choose to leave out of the summary
+SKIPPABLE_SECTIONS = ['references', 'appendix', 'acknowledgements']
+
+# Seconds between UI refreshes while following a background job
+JOB_POLL_INTERVAL = 0.5
 
 
 def setup_page_config():
@@ -39,28 +73,46 @@ def setup_page_config():
     """, unsafe_allow_html=True)
 
 
+def bind_session_log_context():
+    """Tag log records from this script run with the Streamlit session id"""
+    ctx = get_script_run_ctx()
+    if ctx:
+        set_log_context(session=ctx.session_id)
+    return ctx.session_id if ctx else None
+
 def render_sidebar():
     """Render the collapsible sidebar with file upload and settings"""
     
     # Only render sidebar content if show_sidebar is True
     if not st.session_state.get('show_sidebar', True):
-        return None, 4000, 500  # Return default values when sidebar is hidden
+        return [], DEFAULT_SETTINGS.copy()  # Return default values when sidebar is hidden
     
     # Sidebar header
     st.markdown("### 📁 Document Upload")
     
     # File Upload Section
     st.markdown('<div class="upload-section">', unsafe_allow_html=True)
-    uploaded_file = st.file_uploader(
-        "Choose your document",
+    uploaded_files = st.file_uploader(
+        "Choose your documents",
         type=['pdf', 'docx', 'doc', 'txt', 'md'],
-        help="Upload your document in supported format"
+        accept_multiple_files=True,
+        help="Upload one document, or several to summarize them side by side"
     )
     st.markdown('</div>', unsafe_allow_html=True)
     
-    # Display uploaded file info - only when file is uploaded
-    if uploaded_file:
-        doc_info = get_document_info(uploaded_file)
+    # Several uploads: list them without parsing, extraction happens on the job pool
+    if len(uploaded_files) > 1:
+        total_mb = sum(uploaded_file.size for uploaded_file in uploaded_files) / MB
+        st.markdown('<div class="file-info">', unsafe_allow_html=True)
+        st.markdown(f"**📚 {len(uploaded_files)} documents** ({total_mb:.2f} MB)")
+        for uploaded_file in uploaded_files:
+            st.markdown(f"- {uploaded_file.name} ({uploaded_file.size / MB:.2f} MB)")
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Display uploaded file info - only when a single file is uploaded
+    if len(uploaded_files) == 1:
+        uploaded_file = uploaded_files[0]
+        doc_info = get_cached_document_info(uploaded_file)
         
         # Calculate file_size_mb BEFORE using it
         file_size_mb = doc_info['size'] / (1024 * 1024)
@@ -71,18 +123,23 @@ def render_sidebar():
         if doc_info['pages'] > 0:
             st.markdown(f"**Pages:** {doc_info['pages']}")
         st.markdown('</div>', unsafe_allow_html=True)
+        
+        memory = get_session_memory_usage()
+        memory_note = f"Text in memory: {memory['text_bytes'] / MB:.1f} / {memory['budget_bytes'] / MB:.0f} MB"
+        if memory['disk_bytes']:
+            memory_note += f" · on disk: {memory['disk_bytes'] / MB:.1f} MB"
+        st.caption(memory_note)
     
     # Processing Settings
     st.markdown("### ⚙️ Settings")
     st.markdown('<div class="settings-section">', unsafe_allow_html=True)
     
-    chunk_size = st.slider(
-        "Chunk Size",
-        min_value=2000,
-        max_value=6000,
-        value=4000,
-        step=500,
-        help="Size of text chunks for processing"
+    token_budget = st.select_slider(
+        "Tokens per Call",
+        options=TOKEN_BUDGET_OPTIONS,
+        value=CALL_TOKEN_BUDGET if CALL_TOKEN_BUDGET in TOKEN_BUDGET_OPTIONS else 100000,
+        format_func=lambda tokens: f"{tokens // 1000}k",
+        help="Estimated input tokens per AI call; documents within budget are summarized in one call"
     )
     
     chunk_overlap = st.slider(
@@ -94,11 +151,42 @@ def render_sidebar():
         help="Overlap between chunks for context preservation"
     )
     
+    summary_mode = st.radio(
+        "Summary Mode",
+        options=[MODE_AI, MODE_INSTANT],
+        help="Instant mode picks key sentences locally without calling the AI model"
+    )
+    
+    excluded_sections = st.multiselect(
+        "Skip Sections",
+        options=SKIPPABLE_SECTIONS,
+        default=list(DEFAULT_EXCLUDED_SECTIONS),
+        format_func=str.title,
+        help="Detected sections left out of the summary (saves AI calls)"
+    )
+    
+    compression_ratio = st.slider(
+        "Pre-compression",
+        min_value=0.2,
+        max_value=1.0,
+        value=1.0,
+        step=0.1,
+        format="%.1f",
+        help="Fraction of the text sent to the AI, keeping the most central sentences (1.0 = off)"
+    )
+    
     st.markdown('</div>', unsafe_allow_html=True)
     
-    return uploaded_file, chunk_size, chunk_overlap
+    settings = {
+        'token_budget': token_budget,
+        'chunk_overlap': chunk_overlap,
+        'summary_mode': summary_mode,
+        'compression_ratio': compression_ratio,
+        'excluded_sections': tuple(excluded_sections)
+    }
+    return uploaded_files, settings
 
-def render_main_content(uploaded_file, chunk_size, chunk_overlap, api_key_valid):
+def render_main_content(uploaded_files, settings, api_key_valid):
     """Render the main content area with sidebar toggle"""
     
 
@@ -130,10 +218,10 @@ def render_main_content(uploaded_file, chunk_size, chunk_overlap, api_key_valid)
         return
     
     # Show upload instruction when sidebar is hidden and no file uploaded
-    if not st.session_state.get('show_sidebar', True) and not uploaded_file:
+    if not st.session_state.get('show_sidebar', True) and not uploaded_files:
         st.info("📁 Click 'Settings' button above to upload your document and configure processing options.")
     
-    if not uploaded_file:
+    if not uploaded_files:
         # Clean welcome section
         st.markdown("""
         <div class="welcome-section">
@@ -160,106 +248,320 @@ def render_main_content(uploaded_file, chunk_size, chunk_overlap, api_key_valid)
         
         return
     
+    if len(uploaded_files) > 1:
+        render_multi_document_content(uploaded_files, settings)
+        return
+    uploaded_file = uploaded_files[0]
+    
+    # Reattach to a summary still running for this document, e.g. after a rerun or reload
+    job = get_summary_job(make_job_key(get_file_hash(uploaded_file), settings))
+    if job and not job.finished:
+        log_info(f"Reattaching to summary job {job.id} for {uploaded_file.name}")
+        watch_summary_job(job, uploaded_file)
+        render_question_box(uploaded_file)
+        return
+    
     # Generate Summary Button
     if st.button("🚀 Generate Summary", type="primary"):
         log_info(f"User initiated summary generation for {uploaded_file.name}")
-        process_document_and_generate_summary(uploaded_file, chunk_size, chunk_overlap)
+        process_document_and_generate_summary(uploaded_file, settings)
+    
+    render_question_box(uploaded_file)
+
+def render_question_box(uploaded_file):
+    """Answer questions about the document from its most relevant passages in a single AI call"""
+    st.markdown("### ❓ Ask About This Document")
+    with st.form("question_form"):
+        question = st.text_input("Question", placeholder="e.g. Which datasets were used for evaluation?")
+        asked = st.form_submit_button("Ask")
+    if not asked or not question.strip():
+        return
+    
+    log_info(f"User asked a question about {uploaded_file.name}")
+    text = get_cached_document_text(uploaded_file)
+    if not text:
+        st.error("❌ Failed to extract text from document. Please try a different file.")
+        return
+    
+    # Built once per document and reused from disk afterwards
+    with st.spinner("Indexing document..."):
+        document_index = get_document_index(text, get_file_hash(uploaded_file))
+    
+    llm = initialize_chat_llm()
+    if not llm:
+        st.error("❌ Failed to initialize the AI model. Please check your API key in .env file.")
+        return
+    
+    answer_placeholder = st.empty()
+    answer, hits = answer_question(llm, question, document_index,
+                                   on_token=lambda partial: answer_placeholder.markdown(f"{partial} ▌"))
+    if answer:
+        answer_placeholder.markdown(answer)
+    else:
+        answer_placeholder.error("❌ Failed to answer the question. Please try again.")
+    
+    if hits:
+        with st.expander(f"📚 Sources ({len(hits)} of {len(document_index)} passages)"):
+            for i, (score, chunk_id, chunk) in enumerate(hits, start=1):
+                st.markdown(f"**[{i}]** Passage {chunk_id + 1} · similarity {score:.2f}")
+                st.text(chunk)
+
+def render_multi_document_content(uploaded_files, settings):
+    """Summarize several uploads on the shared job pool, or follow jobs already started for them"""
+    job_keys = [make_job_key(get_file_hash(uploaded_file), settings) for uploaded_file in uploaded_files]
+    jobs = [get_summary_job(job_key) for job_key in job_keys]
+    
+    # Jobs are only submitted from an explicit click: reruns (downloads, added files) must not
+    # spend quota on their own. Failed jobs wait for the retry button for the same reason.
+    new_count = sum(1 for job in jobs if job is None)
+    submit_new = False
+    if new_count:
+        button_slot = st.empty()
+        label = "Documents" if new_count == len(jobs) else "New Documents"
+        submit_new = button_slot.button(f"🚀 Summarize {new_count} {label}", type="primary")
+        if submit_new:
+            button_slot.empty()
+            log_info(f"User initiated summary generation for {new_count} documents")
+    retry_failed = st.session_state.pop('retry_failed_jobs', False)
+    
+    instant = settings['summary_mode'] == MODE_INSTANT
+    memory_budget = get_session_memory_budget()
+    jobs = [
+        submit_document_job(job_key, uploaded_file, get_file_hash(uploaded_file), settings, instant,
+                            memory_budget)
+        if (job is None and submit_new) or (job and job.status == JOB_FAILED and retry_failed) else job
+        for job_key, job, uploaded_file in zip(job_keys, jobs, uploaded_files)
+    ]
+    jobs = [job for job in jobs if job]
+    if not jobs:
+        return
+    watch_document_jobs(jobs)
+    
+    failed = sum(1 for job in jobs if job.status == JOB_FAILED)
+    if failed:
+        st.button(f"🔁 Retry {failed} Failed", on_click=request_failed_job_retry)
+
+def request_failed_job_retry():
+    """Button callback: resubmit failed jobs on the next run"""
+    st.session_state['retry_failed_jobs'] = True
 
-def process_document_and_generate_summary(uploaded_file, chunk_size, chunk_overlap):
-    """Process document and generate summary with clean progress UI"""
+def watch_document_jobs(jobs):
+    """Show a progress row per job, offering each summary for download as soon as it is ready"""
+    st.caption(f"Documents run concurrently; AI calls are capped across all of them at "
+               f"{get_rate_limiter().max_concurrency} in flight.")
+    
+    rows = []
+    for job in jobs:
+        name_col, progress_col, download_col = st.columns([2, 3, 1])
+        name_col.markdown(f"**📄 {job.name}**")
+        with progress_col:
+            progress_bar = st.progress(0)
+            status_text = st.empty()
+        rows.append((job, progress_bar, status_text, download_col.empty()))
+    
+    pending = set(range(len(rows)))
+    while True:
+        for i in sorted(pending):
+            job, progress_bar, status_text, download_slot = rows[i]
+            progress_bar.progress(job.percent)
+            if not job.finished:
+                status_text.caption(job.message)
+                continue
+            
+            pending.discard(i)
+            if job.summary:
+                source = "from cache" if job.cached else f"{job.characters:,} chars"
+                status_text.caption(f"✅ Done ({source})")
+                download_slot.download_button("💾", data=job.summary, file_name=summary_file_name(job.name),
+                                              mime="text/plain", key=f"download_{job.id}",
+                                              help="Download this summary")
+            elif job.error:
+                status_text.caption(f"❌ {job.error}")
+            else:
+                status_text.caption("⚠️ No summary could be produced from this document")
+        if not pending:
+            break
+        time.sleep(JOB_POLL_INTERVAL)
+    
+    finished = [job for job in jobs if job.summary]
+    log_info(f"Multi-document summaries finished: {len(finished)}/{len(jobs)} succeeded")
+    if not finished:
+        return
+    
+    st.download_button(
+        label=f"📦 Download All ({len(finished)} summaries, .zip)",
+        data=build_summary_zip(finished),
+        file_name="summaries.zip",
+        mime="application/zip",
+        type="primary"
+    )
+    for job in finished:
+        with st.expander(f"📋 {job.name}"):
+            st.markdown(job.summary)
+
+def summary_file_name(document_name):
+    """Download name for a document's summary"""
+    return document_name.rsplit('.', 1)[0] + '_summary.txt'
+
+def build_summary_zip(jobs):
+    """Zip the summaries of finished jobs, one text file per document"""
+    buffer = BytesIO()
+    used_names = set()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for job in jobs:
+            name = summary_file_name(job.name)
+            # Uploads may share a file name; keep every summary
+            stem, suffix = name.rsplit('.', 1)
+            counter = 1
+            while name in used_names:
+                counter += 1
+                name = f"{stem}_{counter}.{suffix}"
+            used_names.add(name)
+            archive.writestr(name, job.summary)
+    return buffer.getvalue()
+
+def process_document_and_generate_summary(uploaded_file, settings):
+    """Serve a cached summary or start a background job and follow its progress"""
 
     log_info(f"Starting document processing for {uploaded_file.name}")
+    file_hash = get_file_hash(uploaded_file)
+    
+    # Step 1: Serve from cache before extracting, since the key needs only the upload's hash
+    if settings['summary_mode'] != MODE_INSTANT:
+        cache_key = make_document_cache_key(file_hash, settings['token_budget'], settings['chunk_overlap'],
+                                            settings['excluded_sections'], settings['compression_ratio'])
+        cached_summary = get_cached_summary(cache_key)
+        if cached_summary:
+            log_info(f"Serving cached summary for {uploaded_file.name}")
+            display_summary_results(cached_summary, uploaded_file)
+            return
+    
+    # Step 2: Extract text (silent)
+    text = get_cached_document_text(uploaded_file)
+    if not text:
+        log_error(f"Failed to extract text from {uploaded_file.name}")
+        st.error("❌ Failed to extract text from document. Please try a different file.")
+        return
+    
+    in_memory = isinstance(text, str)
+    if settings['summary_mode'] == MODE_INSTANT:
+        if not in_memory:
+            st.warning("⚠️ This document is too large for an instant summary within the memory budget. "
+                       "Switch to AI summary to process it from disk.")
+            return
+        display_summary_results(extractive_summary(text), uploaded_file, text)
+        return
+    
+    # Pre-stages: drop skipped sections, then optionally keep only the most central sentences
+    if not in_memory:
+        st.info("📦 Large document: processing from disk without section skipping or pre-compression.")
+    llm_text, sections, cache_key = prepare_llm_text(text, settings, file_hash)
+    
+    # Text processed from disk skips the pre-stages, so it is cached under a different key
+    if not in_memory:
+        cached_summary = get_cached_summary(cache_key)
+        if cached_summary:
+            log_info(f"Serving cached summary for {uploaded_file.name}")
+            display_summary_results(cached_summary, uploaded_file, text)
+            return
     
-    # Create progress container
+    # Step 3: Summarize in the background so reruns and reloads don't cancel the work
+    job_key = make_job_key(file_hash, settings)
+    job = submit_summary_job(job_key, uploaded_file.name, llm_text, settings['token_budget'],
+                             settings['chunk_overlap'], cache_key, sections)
+    watch_summary_job(job, uploaded_file)
+
+def watch_summary_job(job, uploaded_file):
+    """Poll a background job, showing progress and streamed output until it finishes"""
+    # Create progress container, and below it an area the final summary streams into
     progress_container = st.empty()
+    stream_placeholder = st.empty()
     
     with progress_container.container():
         st.markdown('<div class="progress-container">', unsafe_allow_html=True)
-        
-        # Step 1: Initialize LLM (silent)
-        llm = initialize_chat_llm()
-        if not llm:
-            log_error("Failed to initialize ChatGoogleGenerativeAI")
-            st.error("❌ Failed to initialize the AI model. Please check your API key in .env file.")
-            return
-        
-        # Step 2: Extract text (silent)
-        text = extract_text_from_document(uploaded_file)
-        if not text:
-            log_error(f"Failed to extract text from {uploaded_file.name}")
-            st.error("❌ Failed to extract text from document. Please try a different file.")
-            return
-        
-        # Step 3: Process document with clean progress display
         st.markdown('<p class="processing-text">🤖 Processing your document...</p>', unsafe_allow_html=True)
         progress_bar = st.progress(0)
         status_text = st.empty()
-        
-        # Determine processing approach
-        if len(text) <= 15000:
-            status_text.markdown("*Analyzing document structure and content...*")
-            progress_bar.progress(50)
-            log_info("Processing as single chunk")
-        else:
-            chunks = chunk_text(text, chunk_size, chunk_overlap)
-            status_text.markdown(f"*Processing document in {len(chunks)} intelligent sections...*")
-            progress_bar.progress(25)
-            log_info(f"Processing in {len(chunks)} chunks")
-        
-        # Generate summary
-        summary = process_document(text, llm, chunk_size, chunk_overlap, 
-                                 progress_bar, status_text)
-        
         st.markdown('</div>', unsafe_allow_html=True)
     
-    # Clear progress and show results
+    rendered_partial = ""
+    while not job.finished:
+        progress_bar.progress(job.percent)
+        status_text.markdown(f"*{job.message}*")
+        if job.partial_summary != rendered_partial:
+            rendered_partial = job.partial_summary
+            stream_placeholder.markdown(f"## 📋 Document Summary\n\n{rendered_partial} ▌")
+        time.sleep(JOB_POLL_INTERVAL)
+    
+    # Clear progress and streamed preview, then show results
     progress_container.empty()
+    stream_placeholder.empty()
     
-    if summary:
+    if job.summary:
         log_info("Summary generated successfully")
-        display_summary_results(summary, uploaded_file, text)
+        display_summary_results(job.summary, uploaded_file, get_cached_document_text(uploaded_file))
     else:
-        log_error("Failed to generate summary")
-        st.error("❌ Failed to generate summary. Please try again.")
+        log_error(f"Failed to generate summary: {job.error}")
+        st.error(f"❌ {job.error}")
 
-def display_summary_results(summary, uploaded_file, original_text):
-    """Display the generated summary with clean styling"""
-    st.success("✅ Summary generated successfully!")
-    
-    # Summary display with clean styling
-    st.markdown('<div class="summary-container">', unsafe_allow_html=True)
-    st.markdown("## 📋 Document Summary")
-    st.markdown(summary)
-    st.markdown('</div>', unsafe_allow_html=True)
+def display_summary_results(summary, uploaded_file, original_text=None):
+    """Display the generated summary with clean styling
     
-    # Action buttons
-    col1, col2, col3 = st.columns([3, 1, 1])
-    
-    with col1:
-        filename = uploaded_file.name.rsplit('.', 1)[0] + '_summary.txt'
-        st.download_button(
-            label="💾 Download Summary",
-            data=summary,
-            file_name=filename,
-            mime="text/plain"
-        )
-        log_info(f"Summary download button created for {filename}")
-    
-    with col2:
-        if st.button("🔄 New Summary"):
-            log_info("User requested new summary generation")
-            st.rerun()
-    
-    with col3:
-        # Clean statistics
-        with st.expander("📊 Analytics"):
-            st.metric("Original", f"{len(original_text):,} chars", help="Characters in original document")
-            st.metric("Summary", f"{len(summary):,} chars", help="Characters in generated summary")
-            
-            compression = round((1 - len(summary)/len(original_text)) * 100, 1)
-            st.metric("Compression", f"{compression}%", help="Reduction in document size")
+    original_text is None for a summary served from the cache before extraction.
+    """
+    with stage_timer("rendering", input_chars=len(summary)):
+        st.success("✅ Summary generated successfully!")
+    
+        # Summary display with clean styling
+        st.markdown('<div class="summary-container">', unsafe_allow_html=True)
+        st.markdown("## 📋 Document Summary")
+        st.markdown(summary)
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+        # Action buttons
+        col1, col2, col3 = st.columns([3, 1, 1])
+    
+        with col1:
+            filename = summary_file_name(uploaded_file.name)
+            st.download_button(
+                label="💾 Download Summary",
+                data=summary,
+                file_name=filename,
+                mime="text/plain"
+            )
+            log_info(f"Summary download button created for {filename}")
+    
+        with col2:
+            if st.button("🔄 New Summary"):
+                log_info("User requested new summary generation")
+                st.rerun()
+    
+        with col3:
+            # Clean statistics
+            with st.expander("📊 Analytics"):
+                if original_text is not None:
+                    st.metric("Original", f"{len(original_text):,} chars", help="Characters in original document")
+                st.metric("Summary", f"{len(summary):,} chars", help="Characters in generated summary")
             
-            reading_time = max(1, round(len(summary) / 200))  # ~200 words per minute
-            st.metric("Read Time", f"{reading_time} min", help="Estimated reading time")
+                if original_text is not None:
+                    compression = round((1 - len(summary)/len(original_text)) * 100, 1)
+                    st.metric("Compression", f"{compression}%", help="Reduction in document size")
+                    log_info(f"Summary stats - Original: {len(original_text)}, Summary: {len(summary)}, "
+                             f"Compression: {compression}%")
             
-            log_info(f"Summary stats - Original: {len(original_text)}, Summary: {len(summary)}, Compression: {compression}%")
+                reading_time = max(1, round(len(summary) / 200))  # ~200 words per minute
+                st.metric("Read Time", f"{reading_time} min", help="Estimated reading time")
+                
+                stage_summary = get_stage_summary()
+                if stage_summary:
+                    st.markdown("**Stage timings**")
+                    st.table([
+                        {
+                            "Stage": stage,
+                            "Calls": stats["count"],
+                            "Errors": stats["errors"],
+                            "p50 (s)": round(stats["p50"], 3),
+                            "p99 (s)": round(stats["p99"], 3),
+                        }
+                        for stage, stats in stage_summary.items()
+                    ])
@@ -26,3 +26,14 @@ def estimate_processing_time(text_length):
     else:
         minutes = seconds / 60
         return f"~{int(minutes)} minutes"
+
+# Rough estimate: ~4 characters per token for English prose
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    """Estimate token count for text"""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def tokens_to_chars(tokens):
+    """Estimate how many characters fit in a token count"""
+    return tokens * CHARS_PER_TOKEN
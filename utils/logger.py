@@ -1,83 +1,249 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
 import streamlit as st
 
+LOGS_DIR = "logs"
+LOG_FILE = os.path.join(LOGS_DIR, "document_summarizer.log")
+
+# Size-based rotation; the active file plus this many numbered backups are kept
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Minimum seconds between progress lines for the same loop (first and last are always logged)
+PROGRESS_LOG_INTERVAL = float(os.getenv("PROGRESS_LOG_INTERVAL", "2"))
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+# Bytes read per step when scanning log files backwards
+TAIL_BLOCK_SIZE = 64 * 1024
+
+# Upper bound on bytes a single query scans, so rare filters cannot read hundreds of MB
+MAX_QUERY_SCAN_BYTES = int(os.getenv("MAX_LOG_QUERY_SCAN_BYTES", str(64 * 1024 * 1024)))
+
+# Fields (session, document, job...) attached to every record logged in the current context
+_log_context = contextvars.ContextVar("log_context", default={})
+
+_setup_lock = threading.Lock()
+_listener = None
+_progress_lock = threading.Lock()
+_progress_last = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Attach the caller's log context fields to each record before it is queued"""
+
+    def filter(self, record):
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
 def setup_logger():
-    """Setup logging configuration"""
-    # Create logs directory if it doesn't exist
-    logs_dir = "logs"
-    if not os.path.exists(logs_dir):
-        os.makedirs(logs_dir)
-    
-    # Create log filename with current date
-    log_filename = f"document_summarizer_{datetime.now().strftime('%Y%m%d')}.log"
-    log_filepath = os.path.join(logs_dir, log_filename)
-    
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_filepath, encoding='utf-8'),
-            logging.StreamHandler()  # Also log to console
-        ]
-    )
+    """Route logging through a background queue listener; only the first call in a process does anything"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        
+        os.makedirs(LOGS_DIR, exist_ok=True)
+        
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+        file_handler.setFormatter(JsonFormatter())
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        
+        # Callers only enqueue records; formatting and disk I/O happen on the listener thread
+        log_queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(
+            log_queue, file_handler, console_handler, respect_handler_level=True
+        )
+        _listener.start()
+        atexit.register(_listener.stop)
+        
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        root.addHandler(queue_handler)
+        root.setLevel(LOG_LEVEL)
     
     # Log application start
     logging.info("="*50)
     logging.info("Document Summarizer Application Started")
-    logging.info(f"Log file: {log_filepath}")
+    logging.info(f"Log file: {LOG_FILE}")
     logging.info("="*50)
 
-def log_info(message):
+def log_info(message, **fields):
     """Log info message"""
-    logging.info(message)
+    logging.info(message, extra=fields or None)
 
-def log_error(message):
+def log_error(message, **fields):
     """Log error message"""
-    logging.error(message)
+    logging.error(message, extra=fields or None)
 
-def log_warning(message):
+def log_warning(message, **fields):
     """Log warning message"""
-    logging.warning(message)
+    logging.warning(message, extra=fields or None)
 
-def log_debug(message):
+def log_debug(message, **fields):
     """Log debug message"""
-    logging.debug(message)
+    logging.debug(message, extra=fields or None)
+
+def set_log_context(**fields):
+    """Add fields to every record logged from the current thread or task from now on"""
+    _log_context.set({**_log_context.get(), **fields})
+
+@contextmanager
+def log_context(**fields):
+    """Add fields to every record logged inside the block"""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+def bind_log_context(fn):
+    """Wrap fn so worker threads log with the caller's current context"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+def log_progress(key, message, done, total=None):
+    """Log loop progress, rate-limited per key to one line every PROGRESS_LOG_INTERVAL seconds"""
+    now = time.monotonic()
+    finished = total is not None and done >= total
+    with _progress_lock:
+        last = _progress_last.get(key)
+        if finished:
+            _progress_last.pop(key, None)
+        elif last is not None and now - last < PROGRESS_LOG_INTERVAL:
+            return
+        else:
+            _progress_last[key] = now
+    logging.info(message)
+
+def get_log_files():
+    """Get the active log file followed by its rotated backups, newest first"""
+    files = [LOG_FILE] + [f"{LOG_FILE}.{i}" for i in range(1, LOG_BACKUP_COUNT + 1)]
+    return [path for path in files if os.path.exists(path)]
 
 def get_log_stats():
     """Get logging statistics"""
-    logs_dir = "logs"
-    if not os.path.exists(logs_dir):
-        return {"total_logs": 0, "latest_log": None}
-    
-    log_files = [f for f in os.listdir(logs_dir) if f.endswith('.log')]
+    log_files = get_log_files()
     
     if not log_files:
         return {"total_logs": 0, "latest_log": None}
     
-    latest_log = max(log_files, key=lambda f: os.path.getctime(os.path.join(logs_dir, f)))
-    
     return {
         "total_logs": len(log_files),
-        "latest_log": latest_log,
-        "logs_directory": logs_dir
+        "latest_log": os.path.basename(log_files[0]),
+        "total_bytes": sum(os.path.getsize(path) for path in log_files),
+        "logs_directory": LOGS_DIR
     }
 
+def iter_lines_reversed(path, block_size=TAIL_BLOCK_SIZE):
+    """Yield a file's lines last to first, reading fixed-size blocks backwards from the end"""
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        remainder = b""
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            lines = (f.read(step) + remainder).split(b"\n")
+            # The first piece may be the tail of a line that starts in an earlier block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line.decode('utf-8', errors='replace')
+        if remainder:
+            yield remainder.decode('utf-8', errors='replace')
+
+def parse_log_line(line):
+    """Parse a JSON log line into a dict, wrapping plain-text lines as messages"""
+    try:
+        entry = json.loads(line)
+        if isinstance(entry, dict):
+            return entry
+    except ValueError:
+        pass
+    return {"message": line}
+
+def query_logs(limit=50, level=None, session=None, document=None, stage=None, match=None,
+               max_scan_bytes=MAX_QUERY_SCAN_BYTES):
+    """Get the most recent log entries matching the filters, newest first"""
+    levels = {level} if isinstance(level, str) else set(level or ())
+    entries = []
+    scanned = 0
+    
+    for path in get_log_files():
+        for line in iter_lines_reversed(path):
+            scanned += len(line) + 1
+            if scanned > max_scan_bytes:
+                return entries
+            
+            entry = parse_log_line(line)
+            if levels and entry.get("level") not in levels:
+                continue
+            if session and entry.get("session") != session:
+                continue
+            if document and document not in str(entry.get("document", "")):
+                continue
+            if stage and entry.get("stage") != stage:
+                continue
+            if match and not match(entry):
+                continue
+            
+            entries.append(entry)
+            if len(entries) >= limit:
+                return entries
+    return entries
+
 def get_recent_logs(lines=50):
     """Get recent log entries"""
-    logs_dir = "logs"
-    log_filename = f"document_summarizer_{datetime.now().strftime('%Y%m%d')}.log"
-    log_filepath = os.path.join(logs_dir, log_filename)
-    
-    if not os.path.exists(log_filepath):
-        return "No logs available for today."
+    if not os.path.exists(LOG_FILE):
+        return "No logs available."
     
     try:
-        with open(log_filepath, 'r', encoding='utf-8') as f:
-            all_lines = f.readlines()
-            recent_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
-            return ''.join(recent_lines)
+        recent_lines = []
+        for line in iter_lines_reversed(LOG_FILE):
+            recent_lines.append(line)
+            if len(recent_lines) >= lines:
+                break
+        return '\n'.join(reversed(recent_lines)) + '\n'
     except Exception as e:
         return f"Error reading logs: {str(e)}"
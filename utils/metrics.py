@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.helpers import CHARS_PER_TOKEN
+from utils.logger import log_info
+
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join("metrics", "summarizer.prom"))
+
+# Histogram bucket upper bounds in seconds; LLM calls span sub-second to minutes
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Recent durations kept per stage for p50/p99
+QUANTILE_WINDOW = 2048
+
+_lock = threading.Lock()
+_stages = {}
+_counters = {"llm_rate_limit_retries_total": 0}
+_server = None
+
+
+def _new_stage():
+    return {
+        "buckets": [0] * len(DURATION_BUCKETS),
+        "count": 0,
+        "sum": 0.0,
+        "input_chars": 0,
+        "output_chars": 0,
+        "errors": 0,
+        "recent": deque(maxlen=QUANTILE_WINDOW)
+    }
+
+
+def record_stage(stage, seconds, input_chars=0, output_chars=0, error=False):
+    """Record one completed stage span"""
+    with _lock:
+        metrics = _stages.setdefault(stage, _new_stage())
+        metrics["count"] += 1
+        metrics["sum"] += seconds
+        metrics["input_chars"] += input_chars
+        metrics["output_chars"] += output_chars
+        metrics["errors"] += int(error)
+        metrics["recent"].append(seconds)
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                metrics["buckets"][i] += 1
+    
+    # Structured copy in the log so the diagnostics page can aggregate across restarts
+    log_info(f"Stage {stage} finished in {seconds:.3f}s", stage=stage, seconds=round(seconds, 4),
+             input_chars=input_chars, output_chars=output_chars, error=error)
+
+
+def record_retry():
+    """Count an LLM call retried after a rate-limit error"""
+    with _lock:
+        _counters["llm_rate_limit_retries_total"] += 1
+
+
+class StageSpan:
+    """Mutable span handed out by stage_timer so callers can fill in sizes and outcome"""
+
+    def __init__(self, input_chars):
+        self.input_chars = input_chars
+        self.output_chars = 0
+        self.error = False
+
+
+@contextmanager
+def stage_timer(stage, input_chars=0):
+    """Time a block as one span of `stage`; exceptions are recorded as errors and re-raised"""
+    span = StageSpan(input_chars)
+    start_time = time.perf_counter()
+    try:
+        yield span
+    except Exception:
+        span.error = True
+        raise
+    finally:
+        record_stage(stage, time.perf_counter() - start_time, span.input_chars, span.output_chars, span.error)
+
+
+def _quantile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def get_stage_summary():
+    """Get per-stage count, error count and mean/p50/p99 duration in seconds"""
+    with _lock:
+        snapshot = {stage: (metrics["count"], metrics["errors"], metrics["sum"], sorted(metrics["recent"]))
+                    for stage, metrics in _stages.items()}
+    
+    return {
+        stage: {
+            "count": count,
+            "errors": errors,
+            "mean": total / count if count else 0.0,
+            "p50": _quantile(recent, 0.50),
+            "p99": _quantile(recent, 0.99)
+        }
+        for stage, (count, errors, total, recent) in snapshot.items()
+    }
+
+
+def export_prometheus():
+    """Render all metrics in the Prometheus text exposition format"""
+    lines = [
+        "# HELP summarizer_stage_duration_seconds Duration of pipeline stages",
+        "# TYPE summarizer_stage_duration_seconds histogram"
+    ]
+    with _lock:
+        stages = sorted(_stages.items())
+        counters = dict(_counters)
+        for stage, metrics in stages:
+            # Bucket counts are cumulative: record_stage counts each span in every bound above it
+            for bound, count in zip(DURATION_BUCKETS, metrics["buckets"]):
+                lines.append(f'summarizer_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'summarizer_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {metrics["count"]}')
+            lines.append(f'summarizer_stage_duration_seconds_sum{{stage="{stage}"}} {metrics["sum"]:.6f}')
+            lines.append(f'summarizer_stage_duration_seconds_count{{stage="{stage}"}} {metrics["count"]}')
+        
+        for name, key, help_text in (
+            ("summarizer_stage_input_chars_total", "input_chars", "Characters passed into each stage"),
+            ("summarizer_stage_output_chars_total", "output_chars", "Characters produced by each stage"),
+            ("summarizer_stage_errors_total", "errors", "Failed stage spans")
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for stage, metrics in stages:
+                lines.append(f'{name}{{stage="{stage}"}} {metrics[key]}')
+        
+        lines.append("# HELP summarizer_stage_estimated_tokens_total Estimated input tokens per stage")
+        lines.append("# TYPE summarizer_stage_estimated_tokens_total counter")
+        for stage, metrics in stages:
+            lines.append(f'summarizer_stage_estimated_tokens_total{{stage="{stage}"}} '
+                         f'{metrics["input_chars"] // CHARS_PER_TOKEN}')
+    
+    for name, value in sorted(counters.items()):
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics_file(path=METRICS_FILE):
+    """Atomically write the Prometheus metrics to a file (e.g. for node_exporter's textfile collector)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(export_prometheus())
+    os.replace(temp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = export_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would otherwise flood stderr
+
+
+def start_metrics_server(port):
+    """Serve /metrics on a background thread; only the first call in a process starts it"""
+    global _server
+    with _lock:
+        if _server is not None:
+            return _server
+        _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server